@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pivot aggregation for the CSV Pivot Table Viewer.
+
+``pivot_frame`` builds the pivot from an in-memory DataFrame. ``chunked_pivot``
+produces the same result for files that don't fit in memory: it reads the file
+in chunks, filters each chunk, reduces it to mergeable partial aggregates per
+group (sum, count, min, max) and merges those into the final pivot, so memory
+is bounded by the chunk size and the number of groups rather than file size.
+
+The same partial aggregates let ``parallel_pivot`` (and ``chunked_pivot`` with
+``workers > 1``) spread the work over a process pool and tree-merge the
+results. Inputs below ``DEFAULT_PARALLEL_MIN_ROWS`` stay on the serial path,
+where process start-up and pickling would cost more than they save.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from compaction import widen_floats
+from data_loader import iter_chunks
+from filters import apply_filters
+
+AGG_METHODS = ["sum", "mean", "count", "min", "max"]
+
+# Partial statistics needed per aggregation method, and how to merge each one
+PARTIAL_STATS = {
+    "sum": ["sum"],
+    "mean": ["sum", "count"],
+    "count": ["count"],
+    "min": ["min"],
+    "max": ["max"],
+}
+MERGE_FUNCS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+DEFAULT_CHUNK_ROWS = 500_000
+DEFAULT_PARALLEL_MIN_ROWS = 1_000_000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    """Return the worker count from CSV_PIVOT_WORKERS, or the number of CPUs."""
+    return int(os.environ.get("CSV_PIVOT_WORKERS", os.cpu_count() or 1))
+
+
+def max_workers():
+    """Return the most workers a pivot may use: the shared pool's size."""
+    return max(os.cpu_count() or 1, default_workers())
+
+
+def get_process_pool():
+    """Return the long-lived process pool, so reruns don't pay pool start-up.
+
+    There is one pool of ``max_workers()`` processes; callers wanting fewer
+    workers cap the number of tasks they have running instead.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Streamlit serves sessions from threads; forking a threaded process is unsafe
+            _pool = ProcessPoolExecutor(max_workers=max_workers(),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def bounded_map(func, *iterables, workers):
+    """Like ``map`` over the process pool, with at most ``workers`` tasks running at a time."""
+    pool = get_process_pool()
+    futures = []
+    running = set()
+    for args in zip(*iterables):
+        if len(running) >= workers:
+            _, running = wait(running, return_when=FIRST_COMPLETED)
+        future = pool.submit(func, *args)
+        futures.append(future)
+        running.add(future)
+    return [future.result() for future in futures]
+
+
+def group_keys(row_field, col_field):
+    return [row_field, col_field] if col_field else [row_field]
+
+
+def layout_pivot(agged, row_field, col_field, value_fields):
+    """Shape per-group results like ``pivot_frame`` does.
+
+    ``agged`` holds one row per group, indexed by the group keys, with one
+    column per value field.
+    """
+    if not col_field:
+        return agged.reset_index()
+
+    # Every group is unique here, so "first" just places each value in its cell
+    pivot_result = pd.pivot_table(
+        agged.reset_index(),
+        values=value_fields,
+        index=row_field,
+        columns=col_field,
+        aggfunc="first",
+        fill_value=0,
+        observed=True
+    )
+    return flatten_columns(pivot_result, value_fields)
+
+
+def flatten_columns(pivot_result, value_fields):
+    # For multiple value fields, flatten the column names
+    if len(value_fields) > 1 and isinstance(pivot_result.columns, pd.MultiIndex):
+        pivot_result.columns = [f"{val}_{col}" for val, col in pivot_result.columns]
+    return pivot_result
+
+
+def pivot_frame(df, row_field, col_field, value_fields, agg_method):
+    """Pivot an in-memory DataFrame, grouping by ``row_field`` (and ``col_field``)."""
+    df = widen_floats(df, value_fields)
+    if not col_field:
+        # If no column field is selected, just group by row field
+        return df.groupby(row_field, observed=True)[value_fields].agg(agg_method).reset_index()
+
+    pivot_result = pd.pivot_table(
+        df,
+        values=value_fields,
+        index=row_field,
+        columns=col_field,
+        aggfunc=agg_method,
+        fill_value=0,
+        observed=True
+    )
+    return flatten_columns(pivot_result, value_fields)
+
+
+def partial_aggregate(df, keys, value_fields, agg_method):
+    """Reduce ``df`` to mergeable statistics per group.
+
+    The result is indexed by ``keys`` and has ``(statistic, field)`` columns.
+    """
+    df = widen_floats(df, value_fields)
+    # observed=True keeps categorical keys from producing empty groups
+    grouped = df.groupby(keys, sort=False, observed=True)[value_fields]
+    return pd.concat({stat: grouped.agg(stat) for stat in PARTIAL_STATS[agg_method]}, axis=1)
+
+
+def merge_partials(partials, keys, agg_method):
+    """Merge partial aggregates of disjoint row sets into one partial."""
+    combined = pd.concat(partials)
+    merge_funcs = {column: MERGE_FUNCS[column[0]] for column in combined.columns}
+    return combined.groupby(level=keys, observed=True).agg(merge_funcs)
+
+
+def tree_merge(partials, keys, agg_method):
+    """Merge partial aggregates pairwise until a single partial remains."""
+    while len(partials) > 1:
+        partials = [merge_partials(partials[i:i + 2], keys, agg_method)
+                    for i in range(0, len(partials), 2)]
+    return partials[0]
+
+
+def _aggregate_chunk(chunk, keys, value_fields, agg_method, filters):
+    """Filter a chunk and reduce it to partial aggregates (runs in workers)."""
+    chunk = apply_filters(chunk, filters)
+    if not len(chunk):
+        return None, 0
+    return partial_aggregate(chunk, keys, value_fields, agg_method), len(chunk)
+
+
+def empty_aggregate(row_field, col_field, value_fields):
+    keys = group_keys(row_field, col_field)
+    empty_index = pd.MultiIndex.from_tuples([], names=keys) if col_field else pd.Index([], name=row_field)
+    return pd.DataFrame(columns=list(value_fields), index=empty_index)
+
+
+def parallel_pivot(df, row_field, col_field, value_fields, agg_method,
+                   workers=None, min_rows=DEFAULT_PARALLEL_MIN_ROWS):
+    """Pivot like ``pivot_frame``, aggregating row partitions in a process pool.
+
+    Falls back to ``pivot_frame`` for a single worker or fewer than
+    ``min_rows`` rows.
+    """
+    workers = default_workers() if workers is None else workers
+    if workers <= 1 or len(df) < min_rows:
+        return pivot_frame(df, row_field, col_field, value_fields, agg_method)
+
+    keys = group_keys(row_field, col_field)
+    # Only ship the columns the pivot needs to the workers
+    frame = df[list(dict.fromkeys(keys + list(value_fields)))]
+    bounds = np.linspace(0, len(frame), workers + 1, dtype=int)
+    partitions = [frame.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    partials = bounded_map(partial_aggregate, partitions, [keys] * len(partitions),
+                           [value_fields] * len(partitions), [agg_method] * len(partitions), workers=workers)
+    agged = finalize_partial(tree_merge(partials, keys, agg_method), value_fields, agg_method)
+    return layout_pivot(agged, row_field, col_field, value_fields)
+
+
+def finalize_partial(partial, value_fields, agg_method):
+    """Turn merged partial statistics into one value per group and field."""
+    if agg_method == "mean":
+        return pd.DataFrame({
+            field: partial[("sum", field)] / partial[("count", field)]
+            for field in value_fields
+        })
+    return partial[agg_method][value_fields]
+
+
+def chunked_pivot(source, row_field, col_field, value_fields, agg_method,
+                  filters=(), chunk_rows=DEFAULT_CHUNK_ROWS, workers=1, **read_options):
+    """Pivot a CSV, Parquet or Arrow file without loading it whole.
+
+    With ``workers > 1`` chunks are filtered and aggregated in a process pool
+    while the next chunk is parsed; at most ``workers`` chunks are in flight
+    at a time, which bounds both memory and the processes used.
+
+    Returns ``(pivot_result, rows_read, rows_matched)``.
+    """
+    keys = group_keys(row_field, col_field)
+    usecols = list(dict.fromkeys(keys + list(value_fields) + [flt.column for flt in filters]))
+    filters = tuple(filters)
+    merged = None
+    rows_read = rows_matched = 0
+
+    def fold(result):
+        # Fold partials as we go so memory tracks the number of groups
+        nonlocal merged, rows_matched
+        partial, matched = result
+        rows_matched += matched
+        if partial is not None:
+            merged = partial if merged is None else merge_partials([merged, partial], keys, agg_method)
+
+    pool = get_process_pool() if workers > 1 else None
+    pending = set()
+    for chunk in iter_chunks(source, chunk_rows, usecols=usecols, **read_options):
+        rows_read += len(chunk)
+        if pool is None:
+            fold(_aggregate_chunk(chunk, keys, value_fields, agg_method, filters))
+            continue
+        if len(pending) >= workers:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                fold(future.result())
+        pending.add(pool.submit(_aggregate_chunk, chunk, keys, value_fields, agg_method, filters))
+    for future in pending:
+        fold(future.result())
+
+    if merged is None:
+        agged = empty_aggregate(row_field, col_field, value_fields)
+    else:
+        agged = finalize_partial(merged, value_fields, agg_method)
+    return layout_pivot(agged, row_field, col_field, value_fields), rows_read, rows_matched
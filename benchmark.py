@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the CSV Pivot Table Viewer's load, filter, pivot and export paths.
+
+Synthetic datasets shaped like ``sample_data.csv`` (Region, Product, Date,
+Sales, Quantity) are generated at the requested sizes, written to CSV in
+chunks, and then every stage of the pipeline is timed on them:
+
+- ``csv_parse``: parsing the CSV without date conversion, with each CSV engine
+- ``date_conversion``: converting the Date column
+- ``compact_dtypes``: load-time dtype compaction
+- ``filter_range``, ``filter_values``, ``filter_date``: each filter type
+- ``pivot_table`` and ``groupby``: pivoting with ``pd.pivot_table`` versus
+  ``groupby().unstack()``, for every aggregation method
+- ``export_<format>``: writing the loaded rows in each export format
+
+Results are written as JSON so that runs of different versions can be
+compared with ``--compare``:
+
+    python benchmark.py --rows 10000 1000000 --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from aggregation import AGG_METHODS, pivot_frame
+from compaction import compact_dtypes, parse_dates
+from csv_parsing import CSV_ENGINES
+from data_loader import has_arrow, read_csv
+from export import available_formats, export_to_tempfile, frame_chunks
+from filters import DateRangeFilter, RangeFilter, ValuesFilter, combined_mask
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+GENERATE_CHUNK_ROWS = 1_000_000
+START_DATE = date(2023, 1, 1)
+
+REGION_NAMES = ["North", "South", "East", "West"]
+PRODUCT_NAMES = ["Laptop", "Phone", "Tablet", "Monitor"]
+
+
+def _names(known, count, prefix):
+    return (known + [f"{prefix}{i}" for i in range(len(known) + 1, count + 1)])[:count]
+
+
+def generate_frame(rows, regions=4, products=2, days=365, extra_columns=0, seed=0):
+    """Return ``rows`` synthetic rows shaped like ``sample_data.csv``.
+
+    ``regions``, ``products`` and ``days`` set the cardinality of the
+    Region, Product and Date columns; ``extra_columns`` adds numeric
+    ``MetricN`` columns.
+    """
+    rng = np.random.default_rng(seed)
+    region_names = np.array(_names(REGION_NAMES, regions, "Region"))
+    product_names = np.array(_names(PRODUCT_NAMES, products, "Product"))
+    data = {
+        "Region": region_names[rng.integers(0, regions, rows)],
+        "Product": product_names[rng.integers(0, products, rows)],
+        "Date": pd.Timestamp(START_DATE) + pd.to_timedelta(rng.integers(0, days, rows), unit="D"),
+        "Sales": np.round(rng.lognormal(7, 0.6, rows), 2),
+        "Quantity": rng.integers(1, 21, rows),
+    }
+    for i in range(1, extra_columns + 1):
+        data[f"Metric{i}"] = np.round(rng.normal(100, 25, rows), 2)
+    return pd.DataFrame(data)
+
+
+def write_dataset(path, rows, chunk_rows=GENERATE_CHUNK_ROWS, seed=0, **shape):
+    """Write a synthetic CSV of ``rows`` rows to ``path``, chunk by chunk."""
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        for i, start in enumerate(range(0, rows, chunk_rows)):
+            chunk = generate_frame(min(chunk_rows, rows - start), seed=seed + i, **shape)
+            chunk.to_csv(handle, header=(i == 0), index=False, date_format="%Y-%m-%d")
+    return path
+
+
+def dataset_path(data_dir, rows, regions, products, days, extra_columns):
+    """Return the path of a generated dataset, writing it on first use."""
+    name = f"synthetic_{rows}r_{regions}x{products}_{days}d_{extra_columns}c.csv"
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        write_dataset(path + ".tmp", rows, regions=regions, products=products,
+                      days=days, extra_columns=extra_columns)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def measure(func, repeat):
+    """Call ``func`` ``repeat`` times; return the timings and its last result."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def groupby_pivot(df, row_field, col_field, value_fields, agg_method):
+    """The same pivot as ``pivot_frame``, built with groupby and unstack."""
+    grouped = df.groupby([row_field, col_field], observed=True)[value_fields].agg(agg_method)
+    return grouped.unstack(col_field, fill_value=0)
+
+
+def benchmark_dataset(path, repeat=3, formats=None):
+    """Time every pipeline stage on one CSV; yield ``(name, params, timings)``."""
+    # Read the file once up front, so the first engine timed doesn't pay for sniffing it
+    raw = read_csv(path, convert_dates=False)
+    for engine in [engine for engine in CSV_ENGINES if engine != "auto" and (engine != "pyarrow" or has_arrow())]:
+        timings, _ = measure(partial(read_csv, path, convert_dates=False, engine=engine), repeat)
+        yield "csv_parse", {"engine": engine}, timings
+
+    timings, dates = measure(partial(parse_dates, raw["Date"]), repeat)
+    yield "date_conversion", {}, timings
+    df = raw.assign(Date=dates)
+    del raw
+
+    timings, df = measure(partial(compact_dtypes, df), repeat)
+    yield "compact_dtypes", {}, timings
+
+    regions = df["Region"].unique()
+    filters = {
+        "filter_range": RangeFilter("Sales", *df["Sales"].quantile([0.25, 0.75]).tolist()),
+        "filter_values": ValuesFilter("Region", list(regions[:max(1, len(regions) // 2)])),
+        "filter_date": DateRangeFilter("Date", START_DATE, START_DATE.replace(month=3, day=31)),
+    }
+    for name, flt in filters.items():
+        timings, _ = measure(partial(combined_mask, df, [flt]), repeat)
+        yield name, {}, timings
+
+    for agg_method in AGG_METHODS:
+        args = (df, "Region", "Product", ["Sales", "Quantity"], agg_method)
+        timings, _ = measure(partial(pivot_frame, *args), repeat)
+        yield "pivot_table", {"agg_method": agg_method}, timings
+        timings, _ = measure(partial(groupby_pivot, *args), repeat)
+        yield "groupby", {"agg_method": agg_method}, timings
+
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in formats or available_formats():
+            timings, _ = measure(lambda fmt=fmt: export_to_tempfile(frame_chunks(df), fmt, directory), repeat)
+            yield f"export_{fmt.replace('.', '_')}", {}, timings
+
+
+def run(rows_list, regions=4, products=2, days=365, extra_columns=0, repeat=3, data_dir=None, formats=None):
+    """Benchmark each dataset size; return a JSON-serializable report."""
+    data_dir = data_dir or tempfile.mkdtemp(prefix="pivot_bench_")
+    os.makedirs(data_dir, exist_ok=True)
+    shape = {"regions": regions, "products": products, "days": days, "extra_columns": extra_columns}
+    results = []
+    for rows in rows_list:
+        path = dataset_path(data_dir, rows, **shape)
+        for name, params, timings in benchmark_dataset(path, repeat=repeat, formats=formats):
+            results.append({
+                "benchmark": name, "rows": rows, **shape, **params,
+                "repeat": repeat,
+                "min_seconds": min(timings),
+                "median_seconds": statistics.median(timings),
+            })
+            variant = params.get("agg_method", params.get("engine", ""))
+            print(f"{rows:>12,} {name:<16} {variant:<7} {min(timings):10.4f}s",
+                  file=sys.stderr)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def _result_key(result):
+    return tuple((field, value) for field, value in sorted(result.items())
+                 if field not in ("repeat", "min_seconds", "median_seconds"))
+
+
+def compare(report, baseline):
+    """Return ``(benchmark, rows, variant, baseline s, current s, ratio)`` rows.
+
+    The variant is the aggregation method or CSV engine, if any.
+    """
+    previous = {_result_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in report["results"]:
+        match = previous.get(_result_key(result))
+        if match:
+            rows.append((result["benchmark"], result["rows"], result.get("agg_method", result.get("engine", "")),
+                         match["min_seconds"], result["min_seconds"],
+                         result["min_seconds"] / max(match["min_seconds"], 1e-9)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the load, filter, pivot and export paths.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="Dataset sizes to benchmark (rows)")
+    parser.add_argument("--regions", type=int, default=4, help="Distinct Region values")
+    parser.add_argument("--products", type=int, default=2, help="Distinct Product values")
+    parser.add_argument("--days", type=int, default=365, help="Distinct Date values")
+    parser.add_argument("--extra-columns", type=int, default=0, help="Additional numeric columns")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the minimum is reported")
+    parser.add_argument("--formats", nargs="+", choices=available_formats(), help="Export formats to time")
+    parser.add_argument("--data-dir", help="Where generated datasets are kept and reused")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, regions=args.regions, products=args.products, days=args.days,
+                 extra_columns=args.extra_columns, repeat=args.repeat, data_dir=args.data_dir,
+                 formats=args.formats)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        for name, rows, variant, before, after, ratio in compare(report, baseline):
+            print(f"{rows:>12,} {name:<16} {variant:<7} {before:10.4f}s -> {after:10.4f}s  ({ratio:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
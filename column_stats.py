@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Per-column statistics for the CSV Pivot Table Viewer's filter widgets.
+
+Sliders, multiselects and timelines need each column's range, distinct
+values and per-day counts. ``ColumnStats`` computes these once per column of
+a dataset, either from a whole column or by merging chunk summaries in
+out-of-core mode, and a ``StatsIndex`` keeps them across reruns and
+sessions. Drawing the filter panel then costs O(columns) instead of
+O(rows x columns).
+
+Datetime columns keep per-day counts, from which ``ColumnStats.timeline``
+derives (and remembers) the binned histogram behind the timeline charts.
+
+Distinct values are counted exactly up to ``DISTINCT_LIMIT``. Above that
+only the most frequent values are kept, and the number of distinct values is
+estimated with a k-minimum-values sketch over value hashes.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from caching import LRUCache
+from timeline import DEFAULT_MAX_BINS, timeline_histogram
+
+DISTINCT_LIMIT = 10_000
+SKETCH_SIZE = 1024
+DEFAULT_STATS_CACHE_MB = 256
+
+
+def column_kind(values):
+    """Classify a column as "numeric", "datetime" or "categorical"."""
+    if pd.api.types.is_numeric_dtype(values):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return "datetime"
+    return "categorical"
+
+
+def _value_hashes(values):
+    hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+    return np.unique(hashes)[:SKETCH_SIZE]
+
+
+@dataclass
+class ColumnStats:
+    """Summary of one column: counts, range, distinct values and daily counts."""
+    name: str
+    kind: str
+    count: int = 0
+    null_count: int = 0
+    minimum: object = None
+    maximum: object = None
+    # Rows per distinct value (categorical columns only), sorted by value
+    value_counts: pd.Series = None
+    # True once value_counts holds only the most frequent values
+    approximate: bool = False
+    # Rows per day (datetime columns only), indexed by midnight timestamps
+    daily_counts: pd.Series = None
+    _hashes: np.ndarray = field(default=None, repr=False)
+    _timelines: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_series(cls, values, name=None):
+        """Compute the statistics of a whole column (or one chunk of it)."""
+        non_null = values.dropna()
+        stats = cls(name=name if name is not None else values.name, kind=column_kind(values),
+                    count=len(non_null), null_count=len(values) - len(non_null))
+        if stats.kind == "categorical":
+            counts = non_null.value_counts()
+            # Categorical columns also report unused categories; drop those and
+            # use a plain index so chunks with different categories still merge
+            counts = counts[counts > 0]
+            counts.index = pd.Index(np.asarray(counts.index), name=counts.index.name)
+            stats.value_counts = counts
+            stats._hashes = _value_hashes(stats.value_counts.index)
+            stats._truncate()
+        elif len(non_null):
+            stats.minimum = non_null.min()
+            stats.maximum = non_null.max()
+            if stats.kind == "datetime":
+                stats.daily_counts = non_null.dt.normalize().value_counts().sort_index()
+        return stats
+
+    @classmethod
+    def from_chunks(cls, chunks, name):
+        """Compute the statistics of column ``name`` across DataFrame chunks."""
+        stats = None
+        for chunk in chunks:
+            chunk_stats = cls.from_series(chunk[name], name=name)
+            stats = chunk_stats if stats is None else stats.merge(chunk_stats)
+        return stats if stats is not None else cls(name=name, kind="categorical")
+
+    def merge(self, other):
+        """Combine the statistics of two disjoint sets of rows."""
+        merged = ColumnStats(name=self.name, kind=self.kind,
+                             count=self.count + other.count,
+                             null_count=self.null_count + other.null_count,
+                             approximate=self.approximate or other.approximate)
+        bounds = [value for value in (self.minimum, other.minimum) if value is not None]
+        merged.minimum = min(bounds) if bounds else None
+        bounds = [value for value in (self.maximum, other.maximum) if value is not None]
+        merged.maximum = max(bounds) if bounds else None
+        merged.value_counts = _add_counts(self.value_counts, other.value_counts)
+        merged.daily_counts = _add_counts(self.daily_counts, other.daily_counts)
+        if self._hashes is not None or other._hashes is not None:
+            hashes = [h for h in (self._hashes, other._hashes) if h is not None]
+            merged._hashes = np.unique(np.concatenate(hashes))[:SKETCH_SIZE]
+        merged._truncate()
+        return merged
+
+    def _truncate(self):
+        if self.value_counts is None:
+            return
+        if len(self.value_counts) > DISTINCT_LIMIT:
+            self.approximate = True
+            self.value_counts = self.value_counts.nlargest(DISTINCT_LIMIT)
+        try:
+            self.value_counts = self.value_counts.sort_index()
+        except TypeError:
+            # Mixed-type values have no order; keep them by frequency
+            pass
+
+    @property
+    def distinct_count(self):
+        """Number of distinct non-null values; an estimate when approximate."""
+        if self.value_counts is None:
+            return None
+        if not self.approximate or self._hashes is None or len(self._hashes) < SKETCH_SIZE:
+            return len(self.value_counts)
+        # k-minimum-values estimate: k hashes spread over [0, kth smallest]
+        kth = float(self._hashes[SKETCH_SIZE - 1]) / float(np.iinfo(np.uint64).max)
+        return int((SKETCH_SIZE - 1) / kth)
+
+    def timeline(self, max_bins=DEFAULT_MAX_BINS):
+        """Return ``(DataFrame of 'date' and 'count', bin label)`` for a datetime column."""
+        if max_bins not in self._timelines:
+            daily = self.daily_counts if self.daily_counts is not None else pd.Series([], dtype="int64")
+            self._timelines[max_bins] = timeline_histogram(daily.index, weights=daily.to_numpy(),
+                                                           max_bins=max_bins)
+        return self._timelines[max_bins]
+
+    @property
+    def values(self):
+        """Distinct values (or the most frequent ones when approximate)."""
+        return [] if self.value_counts is None else self.value_counts.index.tolist()
+
+    @property
+    def nbytes(self):
+        size = 0
+        for series in (self.value_counts, self.daily_counts):
+            if series is not None:
+                size += int(series.memory_usage(index=True, deep=True))
+        return size + (self._hashes.nbytes if self._hashes is not None else 0)
+
+
+def _add_counts(left, right):
+    if left is None or right is None:
+        return left if right is None else right
+    return left.add(right, fill_value=0).astype("int64")
+
+
+class StatsIndex:
+    """Size-bounded LRU of ``ColumnStats`` keyed by ``(dataset_id, column)``."""
+
+    def __init__(self, max_bytes=DEFAULT_STATS_CACHE_MB * 1024 * 1024):
+        self.stats = LRUCache(max_bytes)
+
+    def get(self, dataset_id, column, compute):
+        """Return the stats of a column, calling ``compute()`` the first time."""
+        key = (dataset_id, column)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = compute()
+            self.stats.put(key, stats)
+        return stats
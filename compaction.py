@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Load-time dtype compaction for the CSV Pivot Table Viewer.
+
+Columns come out of the CSV parser in their widest types: strings as Python
+objects, numbers as 64-bit. ``compact_column`` dictionary-encodes
+low-cardinality strings as ``category`` and downcasts numbers to the
+narrowest type that holds every value exactly. That usually shrinks a
+dataset several times over and makes ``isin`` and grouping much faster.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Strings become categorical when at most this fraction of values is distinct
+DEFAULT_CATEGORY_RATIO = 0.5
+
+# Tried in order when converting date columns; the first one that parses the
+# whole sample is used for the full column
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%d.%m.%Y",
+    "%Y%m%d",
+]
+DATE_SAMPLE_SIZE = 200
+
+
+def infer_date_format(values, formats=DATE_FORMATS, sample_size=DATE_SAMPLE_SIZE):
+    """Return the first format in ``formats`` that parses a sample of ``values``.
+
+    Returns None if the values aren't strings or no format fits.
+    """
+    sample = values.dropna()
+    if sample.empty or not (pd.api.types.is_object_dtype(sample) or pd.api.types.is_string_dtype(sample)):
+        return None
+    sample = sample.iloc[:sample_size].astype(str)
+    for fmt in formats:
+        try:
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+def parse_dates(values):
+    """Convert a column to datetime in one vectorized pass.
+
+    An explicit format is inferred from a sample first; without one pandas
+    falls back to parsing element by element.
+    """
+    fmt = infer_date_format(values)
+    if fmt is not None:
+        return pd.to_datetime(values, format=fmt)
+    with warnings.catch_warnings():
+        # "Could not infer format" just says we're on the slow path already
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.to_datetime(values)
+
+
+def _downcast_float(values):
+    narrow = values.astype(np.float32)
+    # Only keep float32 if every value survives the round trip exactly
+    round_trip = narrow.astype(values.dtype)
+    if ((round_trip == values) | values.isna()).all():
+        return narrow
+    return values
+
+
+def compact_column(values, category_ratio=DEFAULT_CATEGORY_RATIO):
+    """Return ``values`` in the smallest dtype that represents it losslessly."""
+    if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if pd.api.types.is_integer_dtype(values) and isinstance(values.dtype, np.dtype):
+        return pd.to_numeric(values, downcast="integer")
+    if pd.api.types.is_float_dtype(values) and isinstance(values.dtype, np.dtype):
+        return _downcast_float(values)
+    if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+        if len(values) and values.nunique(dropna=True) <= category_ratio * len(values):
+            return values.astype("category")
+    return values
+
+
+def compact_dtypes(df, category_ratio=DEFAULT_CATEGORY_RATIO):
+    """Compact every column of ``df``; returns a new DataFrame."""
+    return pd.DataFrame({col: compact_column(df[col], category_ratio) for col in df.columns},
+                        index=df.index)
+
+
+def widen_floats(df, columns):
+    """Return ``df`` with its float32 ``columns`` as float64.
+
+    float32 holds the loaded values exactly, but sums and means computed in
+    it lose precision, so value fields are widened before aggregating.
+    """
+    narrow = {col: "float64" for col in columns if df[col].dtype == np.float32}
+    return df.astype(narrow) if narrow else df
+
+
+def memory_report(before, after):
+    """Summarize per-column memory use before and after compaction."""
+    return pd.DataFrame({
+        "column": list(before.columns),
+        "dtype_before": [str(dtype) for dtype in before.dtypes],
+        "dtype_after": [str(dtype) for dtype in after.dtypes],
+        "bytes_before": before.memory_usage(index=False, deep=True).to_numpy(),
+        "bytes_after": after.memory_usage(index=False, deep=True).to_numpy(),
+    })
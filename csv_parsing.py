@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+CSV parsing backends for the CSV Pivot Table Viewer.
+
+Every CSV read goes through three steps:
+
+1. ``sniff_dialect`` detects the delimiter and encoding from the first
+   bytes of the file.
+2. ``infer_schema`` parses a prefix of the file to find the text columns
+   and the format of every date column (columns whose name contains
+   "date", plus any given an explicit format).
+3. A backend parses the file with that schema. Text columns are read as
+   strings, so later rows can't change their type, and date columns are
+   parsed with their format in one vectorized pass.
+
+Two backends are available. "pyarrow" uses Arrow's multithreaded CSV
+reader, which also parses dates natively when they all share one format;
+"c" is pandas' C parser. The default, "auto", uses pyarrow when it is
+installed and the read is one it supports (whole files, not row prefixes
+or chunks); ``CSV_PIVOT_CSV_ENGINE`` overrides it.
+"""
+
+import codecs
+import csv
+import logging
+import os
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from compaction import infer_date_format, parse_dates
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+logger = logging.getLogger("csv_pivot.loader")
+
+CSV_ENGINES = ["auto", "pyarrow", "c"]
+SNIFF_BYTES = 64 * 1024
+SNIFF_LINES = 50
+DELIMITERS = ",;\t|"
+SCHEMA_SAMPLE_ROWS = 10_000
+
+
+@dataclass
+class CsvSchema:
+    """The dialect and column types of a CSV file, inferred from its prefix."""
+    delimiter: str = ","
+    encoding: str = "utf-8"
+    columns: tuple = ()
+    # Columns holding text in the prefix, read as strings throughout
+    text_columns: tuple = ()
+    # Date column -> strptime format, or None when no single format fits
+    date_formats: dict = field(default_factory=dict)
+
+
+def csv_engine(engine=None):
+    """Resolve ``engine`` (default: ``CSV_PIVOT_CSV_ENGINE`` or "auto")."""
+    engine = (engine or os.environ.get("CSV_PIVOT_CSV_ENGINE") or "auto").lower()
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine {engine!r}; expected one of {', '.join(CSV_ENGINES)}")
+    if engine == "pyarrow" and pa is None:
+        raise ImportError("The pyarrow CSV engine requires the pyarrow package.")
+    return engine
+
+
+def parse_date_formats(text):
+    """Parse ``"Date=%d/%m/%Y;Shipped=%Y%m%d"`` into ``{column: format}``."""
+    formats = {}
+    for item in text.split(";"):
+        if not item.strip():
+            continue
+        column, sep, fmt = item.partition("=")
+        if not sep or not column.strip() or not fmt.strip():
+            raise ValueError(f"Expected COLUMN=FORMAT, got {item.strip()!r}")
+        formats[column.strip()] = fmt.strip()
+    return formats
+
+
+def _head(source, size=SNIFF_BYTES):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            return handle.read(size)
+    source.seek(0)
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+
+def sniff_dialect(head):
+    """Return ``(delimiter, encoding)`` detected from the first bytes of a CSV."""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        candidates = ["utf-16"]
+    else:
+        # Latin-1 decodes any byte sequence, so one of these always fits
+        candidates = ["utf-8", "cp1252", "latin-1"]
+    for encoding in candidates:
+        try:
+            # An incremental decoder tolerates a character cut off at the end of the sample
+            decoder = codecs.getincrementaldecoder("utf-8-sig" if encoding == "utf-8" else encoding)()
+            text = decoder.decode(head)
+            break
+        except UnicodeDecodeError:
+            continue
+    # The last line is most likely cut off
+    lines = text.splitlines()
+    lines = (lines[:-1] or lines)[:SNIFF_LINES]
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines), delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    return delimiter, encoding
+
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+
+def infer_schema(source, date_formats=None, delimiter=None, encoding=None, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """Sniff a CSV and infer its column types from the first ``sample_rows`` rows.
+
+    ``date_formats`` gives explicit formats for some columns; the formats of
+    the other date columns are inferred from the prefix. A given
+    ``delimiter`` or ``encoding`` replaces the sniffed one.
+    """
+    sniffed_delimiter, sniffed_encoding = sniff_dialect(_head(source))
+    delimiter = delimiter or sniffed_delimiter
+    encoding = encoding or sniffed_encoding
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    prefix = pd.read_csv(source, sep=delimiter, encoding=encoding, nrows=sample_rows)
+    date_formats = dict(date_formats or {})
+    formats = {}
+    for col in prefix.columns:
+        values = prefix[col]
+        if col in date_formats:
+            formats[col] = date_formats[col]
+        elif "date" in str(col).lower():
+            text = values.dropna().astype(str)
+            fmt = infer_date_format(text)
+            if fmt is not None or _is_text(values):
+                formats[col] = fmt
+            # Numbers in a column named like a date that match no format aren't dates
+    text_columns = tuple(col for col in prefix.columns if _is_text(prefix[col]) or col in formats)
+    return CsvSchema(delimiter=delimiter, encoding=encoding, columns=tuple(prefix.columns),
+                     text_columns=text_columns, date_formats=formats)
+
+
+def convert_date_columns(df, date_formats=None):
+    """Convert date columns to datetime, in place.
+
+    ``date_formats`` maps columns to formats (None to infer one). Without it,
+    text columns whose name contains 'date' are converted. A column that
+    doesn't parse is left as it is and logged.
+    """
+    if date_formats is None:
+        date_formats = {col: None for col in df.columns if "date" in str(col).lower() and _is_text(df[col])}
+    for col, fmt in date_formats.items():
+        if col not in df.columns or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        values = df[col] if _is_text(df[col]) else df[col].astype("str")
+        try:
+            df[col] = pd.to_datetime(values, format=fmt) if fmt else parse_dates(values)
+        except (ValueError, TypeError, OverflowError) as e:
+            logger.warning("Column %r was left unconverted because it doesn't parse as dates%s: %s",
+                           col, f" with format {fmt!r}" if fmt else "", str(e).splitlines()[0])
+    return df
+
+
+def _pandas_options(schema, usecols, options):
+    options = {"sep": schema.delimiter, "encoding": schema.encoding, **options}
+    if usecols is not None:
+        options["usecols"] = usecols
+    dtype = {col: "str" for col in schema.text_columns}
+    options["dtype"] = {**dtype, **options.get("dtype", {})}
+    return options
+
+
+def _read_pandas(source, schema, usecols, convert_dates, options):
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    df = pd.read_csv(source, **_pandas_options(schema, usecols, options))
+    if convert_dates:
+        convert_date_columns(df, schema.date_formats)
+    return df
+
+
+def _read_arrow(source, schema, usecols, convert_dates):
+    if usecols is not None:
+        unknown = [col for col in usecols if col not in schema.columns]
+        if unknown:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {unknown}")
+        # Keep the file's column order, as pandas does
+        usecols = [col for col in schema.columns if col in usecols]
+    wanted = schema.columns if usecols is None else usecols
+    column_types = {col: pa.string() for col in schema.text_columns if col in wanted}
+    native = {}
+    if convert_dates:
+        native = {col: fmt for col, fmt in schema.date_formats.items() if fmt is not None and col in wanted}
+        if len(set(native.values())) > 1:
+            # Arrow tries every parser on every timestamp column, so a column could be
+            # parsed with another column's format; convert each one in pandas instead
+            native = {}
+    for col in native:
+        column_types[col] = pa.timestamp("us")
+
+    def read(column_types, parsers):
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+        return pacsv.read_csv(
+            source if not isinstance(source, os.PathLike) else str(source),
+            read_options=pacsv.ReadOptions(use_threads=True, encoding=schema.encoding),
+            parse_options=pacsv.ParseOptions(delimiter=schema.delimiter),
+            convert_options=pacsv.ConvertOptions(include_columns=usecols, column_types=column_types,
+                                                 strings_can_be_null=True, timestamp_parsers=parsers),
+        )
+
+    try:
+        table = read(column_types, sorted(set(native.values())) or None)
+        pending = {col: fmt for col, fmt in schema.date_formats.items() if col not in native}
+    except pa.ArrowInvalid as e:
+        if not native:
+            raise
+        # A later row doesn't match a date format; read the dates as text and convert them in pandas
+        logger.warning("Falling back to pandas date parsing: %s", e)
+        table = read({**column_types, **{col: pa.string() for col in native}}, None)
+        pending = dict(schema.date_formats)
+    df = table.to_pandas()
+    if convert_dates:
+        convert_date_columns(df, pending)
+    return df
+
+
+def read_csv(source, schema, convert_dates=True, engine=None, usecols=None, **options):
+    """Parse a CSV into a DataFrame with the chosen backend.
+
+    ``schema`` comes from ``infer_schema``. Other pandas options (e.g.
+    ``nrows``) are only supported by the C parser, which "auto" then falls
+    back to, as it does for duplicate column names.
+    """
+    engine = csv_engine(engine)
+    arrow_ok = pa is not None and not options and len(set(schema.columns)) == len(schema.columns)
+    if engine == "pyarrow" or (engine == "auto" and arrow_ok):
+        if not arrow_ok:
+            raise ValueError(f"The pyarrow CSV engine doesn't support these options: {', '.join(sorted(options))}")
+        return _read_arrow(source, schema, usecols, convert_dates)
+    return _read_pandas(source, schema, usecols, convert_dates, options)
+
+
+def iter_csv(source, schema, chunk_rows, convert_dates=True, usecols=None, **options):
+    """Yield a CSV as DataFrames of at most ``chunk_rows`` rows each.
+
+    Chunks are parsed by pandas' C parser, but with the schema's types and
+    date formats, so every chunk gets the same dtypes.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    options = _pandas_options(schema, usecols, options)
+    with pd.read_csv(source, chunksize=chunk_rows, **options) as reader:
+        for chunk in reader:
+            if convert_dates:
+                convert_date_columns(chunk, schema.date_formats)
+            yield chunk
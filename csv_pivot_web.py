@@ -2,13 +2,90 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import functools
 import os
 import plotly.express as px
+import uuid
 from io import StringIO
 from datetime import datetime, timedelta
 
+from aggregation import AGG_METHODS, default_workers, max_workers
+from column_stats import ColumnStats, StatsIndex
+from csv_parsing import parse_date_formats
+from cubes import CubeStore, find_cube, parse_cube_specs
+from data_loader import DatasetCache, has_arrow, iter_chunks, source_format
+from export import (DEFAULT_EXPORT_CHUNK_ROWS, EXPORT_FORMATS, available_formats, export_index,
+                    export_to_tempfile, frame_chunks, read_export)
+from filters import DateRangeFilter, MaskCache, RangeFilter, ValuesFilter, apply_filters
+from instrumentation import Profiler, env_flag
+from multi_file import MultiFileDataset, resolve_sources
+from paging import page_count, sorted_positions, window_frame
+from pivot_engine import (PivotResult, PivotSpec, ResultCache, answer_from_cubes, execute_streaming, filter_dataset,
+                          open_dataset, pivot)
+from sampling import DEFAULT_PREVIEW_ROWS, approximate_pivot, block_sample, estimate_rows
+
 st.set_page_config(page_title="CSV Pivot Table Viewer", layout="wide")
 
+# Rows read up front for the preview and column types; full columns load on demand
+DATASET_SAMPLE_ROWS = 1000
+OUT_OF_CORE_CHUNK_ROWS = 500_000
+
+# Larger pivot results are shown one window at a time
+RESULT_PAGE_ROWS = 100
+RESULT_PAGE_COLUMNS = 50
+
+# In memory, only datasets this many times the preview sample get a preview
+PREVIEW_MIN_FACTOR = 10
+
+FORMAT_LABELS = {"csv": "CSV", "parquet": "Parquet", "feather": "Arrow"}
+
+# Explicit formats for date columns whose format can't be guessed, e.g. Date=%d/%m/%Y
+DATE_FORMATS = parse_date_formats(os.environ.get("CSV_PIVOT_DATE_FORMATS", ""))
+READ_OPTIONS = {"date_formats": DATE_FORMATS} if DATE_FORMATS else {}
+
+
+@st.cache_resource
+def get_dataset_cache():
+    # One cache per server process, shared by every session and rerun
+    return DatasetCache.from_env()
+
+
+@st.cache_resource
+def get_mask_cache():
+    # Per-filter masks, so moving one slider only re-evaluates that filter
+    max_mb = int(os.environ.get("CSV_PIVOT_MASK_CACHE_MB", 512))
+    return MaskCache(max_bytes=max_mb * 1024 * 1024)
+
+
+@st.cache_resource
+def get_stats_index():
+    # Column statistics behind the filter widgets, computed once per dataset column
+    max_mb = int(os.environ.get("CSV_PIVOT_STATS_CACHE_MB", 256))
+    return StatsIndex(max_bytes=max_mb * 1024 * 1024)
+
+
+@st.cache_resource
+def get_result_cache():
+    # Finished pivots keyed by dataset and full spec, so repeated views come back instantly
+    max_mb = int(os.environ.get("CSV_PIVOT_RESULT_CACHE_MB", 256))
+    return ResultCache(max_bytes=max_mb * 1024 * 1024)
+
+
+@st.cache_resource
+def get_cube_store():
+    # Rollup cubes, built once per dataset and definition and shared by all sessions
+    max_mb = int(os.environ.get("CSV_PIVOT_CUBE_CACHE_MB", 512))
+    return CubeStore(max_bytes=max_mb * 1024 * 1024)
+
+
+# Opt-in timing of each stage of this rerun, switched on in the Diagnostics panel
+profiler = Profiler.from_env(
+    enabled=st.session_state.get("profile_enabled"),
+    cprofile=st.session_state.get("profile_cprofile"),
+    context={"session": st.session_state.setdefault("profile_session", uuid.uuid4().hex[:8])},
+)
+profiler.start()
+
 st.title("CSV Pivot Table Viewer")
 
 # File upload section
@@ -16,51 +93,231 @@ st.subheader("Upload CSV File")
 
 col1, col2 = st.columns([3, 1])
 with col1:
-    uploaded_file = st.file_uploader("Choose a CSV file", type=["csv"])
+    # Parquet and Arrow files load without any text parsing when pyarrow is installed
+    upload_types = ["csv", "parquet", "arrow", "feather"] if has_arrow() else ["csv"]
+    # Several files (e.g. daily partitions) are combined into one dataset
+    uploaded_files = st.file_uploader("Choose CSV files", type=upload_types, accept_multiple_files=True)
+    # Reading from the server's disk is only offered below an explicitly configured root
+    data_root = os.environ.get("CSV_PIVOT_DATA_DIR")
+    server_path = ""
+    if data_root:
+        server_path = st.text_input(f"Or a directory or glob pattern under {data_root}:", key="server_path",
+                                    placeholder="sales/2023-*.csv").strip()
 with col2:
     use_sample = st.checkbox("Use sample data instead", value=True)
+    out_of_core = st.checkbox("Out-of-core mode", value=False, key="out_of_core",
+                              help="Stream the file in chunks instead of loading it into memory. "
+                                   "Use this for files larger than the server's RAM.")
 
-df = None
+# Opening a dataset only reads a sample; columns are loaded once a pivot needs them
+profiler.begin("open dataset")
+dataset = None
+dataset_id = None
+data_source = None
 if use_sample:
     # Sample data path
     sample_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data.csv")
     if os.path.exists(sample_path):
-        df = pd.read_csv(sample_path)
-        # Try to convert date columns
-        for col in df.columns:
-            if 'date' in col.lower():
-                try:
-                    df[col] = pd.to_datetime(df[col])
-                except:
-                    pass
-        st.success(f"Loaded sample data with {len(df)} rows and {len(df.columns)} columns.")
+        data_source = sample_path
+        dataset = open_dataset(sample_path, cache=get_dataset_cache(), sample_rows=DATASET_SAMPLE_ROWS,
+                               **READ_OPTIONS)
+        load_message = "Loaded sample data"
     else:
         st.error("Sample data file not found. Please upload a CSV file.")
-elif uploaded_file is not None:
+elif uploaded_files or server_path:
     try:
-        df = pd.read_csv(uploaded_file)
-        # Try to convert date columns
-        for col in df.columns:
-            if 'date' in col.lower():
-                try:
-                    df[col] = pd.to_datetime(df[col])
-                except:
-                    pass
-        st.success(f"Loaded CSV file with {len(df)} rows and {len(df.columns)} columns.")
+        if uploaded_files:
+            data_source = resolve_sources(uploaded_files)
+        else:
+            root = os.path.realpath(data_root)
+            data_source = resolve_sources(os.path.join(root, server_path))
+            files = data_source if isinstance(data_source, list) else [data_source]
+            if not files:
+                raise ValueError(f"No files match {server_path}")
+            if any(os.path.commonpath([root, os.path.realpath(path)]) != root for path in files):
+                raise ValueError(f"Paths must stay under {data_root}")
+        dataset = open_dataset(data_source, cache=get_dataset_cache(), sample_rows=DATASET_SAMPLE_ROWS,
+                               executor=os.environ.get("CSV_PIVOT_INGEST", "thread"), **READ_OPTIONS)
+        if isinstance(data_source, list):
+            load_message = f"Loaded {len(data_source)} files"
+        else:
+            load_message = f"Loaded {FORMAT_LABELS[source_format(data_source)]} file"
     except Exception as e:
-        st.error(f"Failed to load CSV file: {str(e)}")
+        st.error(f"Failed to load file: {str(e)}")
+
+if dataset is not None:
+    dataset_id = dataset.dataset_id
+    sample_df = dataset.sample
+    # Filled in once the columns the pivot needs have been loaded
+    load_status = st.empty()
+    if out_of_core:
+        load_status.success(f"{load_message} with {len(dataset.columns)} columns.")
+        st.caption(f"Out-of-core mode: previewing the first {len(sample_df)} rows; "
+                   "the pivot streams the whole file in chunks.")
+
+
+def format_bytes(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def column_stats(col):
+    """Return the statistics of a column across the whole dataset."""
+    def compute():
+        if out_of_core:
+            chunks = iter_chunks(data_source, OUT_OF_CORE_CHUNK_ROWS, usecols=[col], **READ_OPTIONS)
+            return ColumnStats.from_chunks(chunks, col)
+        return ColumnStats.from_series(dataset.column(col))
+    return get_stats_index().get(dataset_id, col, compute)
+
+
+def column_range(col):
+    """Return the (min, max) of a column across the whole dataset."""
+    stats = column_stats(col)
+    return stats.minimum, stats.maximum
+
+
+def column_values(col):
+    """Return the sorted distinct values of a column (the most frequent ones if there are many)."""
+    return column_stats(col).values
+
+
+def default_values(col):
+    # Preselecting a truncated value list would silently drop all other values
+    stats = column_stats(col)
+    return [] if stats.approximate else stats.values
+
+
+def values_help(col):
+    """Describe the value list of a column's multiselect, if it needs explaining."""
+    stats = column_stats(col)
+    notes = []
+    if stats.approximate:
+        notes.append(f"Showing the {len(stats.values):,} most frequent of about {stats.distinct_count:,} values. "
+                     "Leave empty to keep every value.")
+    if stats.null_count:
+        notes.append(f"{stats.null_count:,} rows have no value and are excluded when filtering.")
+    return " ".join(notes) or None
+
+
+def show_approximate_result(estimate):
+    """Show a pivot estimated from a sample while the exact one is computed."""
+    hint = "Minimums and maximums are those of the sample."
+    if len(estimate.relative_errors):
+        errors = estimate.relative_errors
+        hint = (f"Typical error ±{np.median(errors):.1%}, largest ±{errors.max():.1%} "
+                "(95% confidence); groups missing from the sample aren't shown.")
+    st.info(f"**Approximate result** estimated from a random sample of {estimate.sample_rows:,} of "
+            f"~{estimate.population_rows:,} rows; sums and counts are scaled up. {hint} "
+            "Computing the exact result...")
+    # Only the first page of rows and columns is sent, like the exact result
+    table = estimate.table
+    st.dataframe(window_frame(table, np.arange(len(table)), 1, RESULT_PAGE_ROWS, 0, RESULT_PAGE_COLUMNS),
+                 use_container_width=True)
+    if len(table) > RESULT_PAGE_ROWS or len(table.columns) > RESULT_PAGE_COLUMNS:
+        st.caption(f"Showing the first {min(len(table), RESULT_PAGE_ROWS)} rows × "
+                   f"{min(len(table.columns), RESULT_PAGE_COLUMNS)} columns of {len(table)} × {len(table.columns)}")
+
+
+def show_paged_result(result, key):
+    """Show a result one window at a time; only the visible cells reach the browser."""
+    total_rows, total_cols = result.shape
+    if total_rows <= RESULT_PAGE_ROWS and total_cols <= RESULT_PAGE_COLUMNS:
+        st.dataframe(result, use_container_width=True)
+        st.caption(f"Showing {total_rows} rows × {total_cols} columns")
+        return
 
-if df is not None:
+    labels = ["(pivot order)"] + [str(column) for column in result.columns]
+    sort_box, order_box, top_box, size_box = st.columns(4)
+    with sort_box:
+        sort_choice = st.selectbox("Sort by:", range(len(labels)), format_func=labels.__getitem__,
+                                   key=f"{key}_sort")
+    with order_box:
+        descending = st.checkbox("Descending", value=True, key=f"{key}_descending")
+    with top_box:
+        top_n = st.number_input("Top N rows (0 = all):", min_value=0, value=0, step=10, key=f"{key}_top_n")
+    with size_box:
+        page_size = st.selectbox("Rows per page:", [50, 100, 250, 500], index=1, key=f"{key}_page_size")
+
+    positions = sorted_positions(result, sort_choice - 1 if sort_choice else None, descending, top_n)
+    pages = page_count(len(positions), page_size)
+    # Keep the current page valid when sorting or top-N shrink the result
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+
+    col_start = 0
+    if total_cols > RESULT_PAGE_COLUMNS:
+        col_start = st.slider("First column:", 0, total_cols - RESULT_PAGE_COLUMNS, 0, key=f"{key}_col_start")
+
+    view = window_frame(result, positions, page, page_size, col_start, RESULT_PAGE_COLUMNS)
+    st.dataframe(view, use_container_width=True)
+    first_row = (page - 1) * page_size + 1 if len(view) else 0
+    st.caption(f"Showing rows {first_row}–{first_row + len(view) - 1 if len(view) else 0} of {len(positions)} "
+               f"and columns {col_start + 1}–{col_start + len(view.columns)} of {total_cols} "
+               f"({total_rows} rows × {total_cols} columns in total)")
+
+
+def discard_export():
+    prepared = st.session_state.pop("export_file", None)
+    if prepared and os.path.exists(prepared["path"]):
+        os.remove(prepared["path"])
+
+
+def show_export_panel(pivot_result, spec, filters):
+    """Offer the pivot or the filtered rows as a download, written only on request."""
+    target_box, format_box = st.columns(2)
+    with target_box:
+        target = st.radio("Export:", ["Pivot table", "Filtered rows"], horizontal=True, key="export_target")
+    with format_box:
+        fmt = st.selectbox("Format:", available_formats(), format_func=lambda key: EXPORT_FORMATS[key][0],
+                           key="export_format")
+    spec = (spec, target, fmt)
+
+    if st.button("Prepare download", key="export_prepare"):
+        discard_export()
+        if target == "Pivot table":
+            chunks = frame_chunks(export_index(pivot_result))
+        else:
+            # Stream every column of the matching rows straight from the source
+            chunks = (apply_filters(chunk, filters)
+                      for chunk in iter_chunks(data_source, DEFAULT_EXPORT_CHUNK_ROWS, **READ_OPTIONS))
+        with st.spinner("Writing export..."):
+            path, rows = export_to_tempfile(chunks, fmt)
+        st.session_state["export_file"] = {"spec": spec, "path": path, "rows": rows}
+
+    prepared = st.session_state.get("export_file")
+    if prepared and prepared["spec"] != spec:
+        # The pivot or the export choice changed, so the prepared file is stale
+        discard_export()
+    elif prepared and os.path.exists(prepared["path"]):
+        _, extension, mime = EXPORT_FORMATS[fmt]
+        file_name = ("pivot_table" if target == "Pivot table" else "filtered_rows") + extension
+        # The file is only read when the button is clicked, not on every rerun
+        st.download_button(
+            label=f"Download {file_name} ({prepared['rows']} rows, "
+                  f"{format_bytes(os.path.getsize(prepared['path']))})",
+            data=functools.partial(read_export, prepared["path"]),
+            file_name=file_name,
+            mime=mime,
+            on_click="ignore",
+        )
+
+
+if dataset is not None:
     # Data Preview in an expandable section
+    profiler.begin("data preview")
     with st.expander("Data Preview", expanded=True):
-        st.dataframe(df.head(20), use_container_width=True)
+        st.dataframe(sample_df.head(20), use_container_width=True)
 
-    # Define column types for filtering
+    # Define column types for filtering (from the sample, before any column is loaded)
     column_types = {}
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
+    for col in sample_df.columns:
+        if pd.api.types.is_numeric_dtype(sample_df[col]):
             column_types[col] = "numeric"
-        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+        elif pd.api.types.is_datetime64_any_dtype(sample_df[col]):
             column_types[col] = "datetime"
         else:
             column_types[col] = "categorical"
@@ -70,18 +327,17 @@ if df is not None:
     
     # Left column for configuration and filtering
     with main_left:
+        profiler.begin("filter widgets")
         st.subheader("Pivot Table Configuration")
         
-        # Start with an unfiltered dataframe
-        filtered_df = df.copy()
-        total_rows = len(df)
-        filtered_rows = len(filtered_df)
+        # Filters are collected here and applied to the data in a single pass
+        active_filters = []
         
         # Get column names
-        columns = df.columns.tolist()
+        columns = dataset.columns
         
         # Filter for numeric columns for values
-        numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+        numeric_columns = sample_df.select_dtypes(include=[np.number]).columns.tolist()
         
         # Default selections
         default_row = columns[0] if columns else None
@@ -95,8 +351,7 @@ if df is not None:
         if st.checkbox(f"Filter {row_field} values", key="filter_row"):
             if column_types[row_field] == "numeric":
                 # For numeric columns, use range sliders
-                min_val = float(df[row_field].min())
-                max_val = float(df[row_field].max())
+                min_val, max_val = (float(value) for value in column_range(row_field))
                 
                 filter_range = st.slider(
                     f"Range for {row_field}:", 
@@ -108,39 +363,34 @@ if df is not None:
                 )
                 
                 # Apply filter
-                filtered_df = filtered_df[(filtered_df[row_field] >= filter_range[0]) & 
-                                       (filtered_df[row_field] <= filter_range[1])]
+                active_filters.append(RangeFilter(row_field, filter_range[0], filter_range[1]))
                 
             elif column_types[row_field] == "categorical":
                 # For categorical columns, use multiselect
-                unique_values = sorted(df[row_field].unique())
+                unique_values = column_values(row_field)
                 selected_values = st.multiselect(
                     f"Values for {row_field}:",
                     unique_values,
-                    default=unique_values,
+                    default=default_values(row_field),
+                    help=values_help(row_field),
                     key="row_filter_values"
                 )
                 
                 # Apply filter
                 if selected_values:
-                    filtered_df = filtered_df[filtered_df[row_field].isin(selected_values)]
+                    active_filters.append(ValuesFilter(row_field, tuple(selected_values)))
             
             elif column_types[row_field] == "datetime":
                 # For datetime columns with timeline chart
-                min_date = df[row_field].min().date()
-                max_date = df[row_field].max().date()
+                min_date, max_date = (value.date() for value in column_range(row_field))
                 
-                # Create a histogram to show data distribution over time
-                date_counts = df[row_field].dt.date.value_counts().sort_index()
-                date_df = pd.DataFrame({
-                    'date': date_counts.index,
-                    'count': date_counts.values
-                })
+                # Histogram of the data over time, binned server-side to a bounded number of bars
+                date_df, bin_label = column_stats(row_field).timeline()
                 
                 # Display the timeline chart
                 st.write("Data distribution over time:")
                 fig = px.bar(date_df, x='date', y='count', 
-                            title=f"Timeline for {row_field}",
+                            title=f"Timeline for {row_field} (per {bin_label})",
                             labels={'date': 'Date', 'count': 'Count'},
                             height=200)
                 fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
@@ -157,10 +407,7 @@ if df is not None:
                 
                 if len(date_range) == 2:
                     st.caption(f"Selected range: {date_range[0]} to {date_range[1]}")
-                    filtered_df = filtered_df[
-                        (filtered_df[row_field].dt.date >= date_range[0]) & 
-                        (filtered_df[row_field].dt.date <= date_range[1])
-                    ]
+                    active_filters.append(DateRangeFilter(row_field, date_range[0], date_range[1]))
         
         # Column selection with inline filter
         st.write("**Column Field (optional)**")
@@ -171,8 +418,7 @@ if df is not None:
         # Add filter for column field if a column is selected
         if col_field and st.checkbox(f"Filter {col_field} values", key="filter_col"):
             if column_types[col_field] == "numeric":
-                min_val = float(df[col_field].min())
-                max_val = float(df[col_field].max())
+                min_val, max_val = (float(value) for value in column_range(col_field))
                 
                 filter_range = st.slider(
                     f"Range for {col_field}:", 
@@ -183,36 +429,31 @@ if df is not None:
                     key="col_filter_range"
                 )
                 
-                filtered_df = filtered_df[(filtered_df[col_field] >= filter_range[0]) & 
-                                       (filtered_df[col_field] <= filter_range[1])]
+                active_filters.append(RangeFilter(col_field, filter_range[0], filter_range[1]))
                 
             elif column_types[col_field] == "categorical":
-                unique_values = sorted(df[col_field].unique())
+                unique_values = column_values(col_field)
                 selected_values = st.multiselect(
                     f"Values for {col_field}:",
                     unique_values,
-                    default=unique_values,
+                    default=default_values(col_field),
+                    help=values_help(col_field),
                     key="col_filter_values"
                 )
                 
                 if selected_values:
-                    filtered_df = filtered_df[filtered_df[col_field].isin(selected_values)]
+                    active_filters.append(ValuesFilter(col_field, tuple(selected_values)))
             
             elif column_types[col_field] == "datetime":
-                min_date = df[col_field].min().date()
-                max_date = df[col_field].max().date()
+                min_date, max_date = (value.date() for value in column_range(col_field))
                 
-                # Create a histogram to show data distribution over time
-                date_counts = df[col_field].dt.date.value_counts().sort_index()
-                date_df = pd.DataFrame({
-                    'date': date_counts.index,
-                    'count': date_counts.values
-                })
+                # Histogram of the data over time, binned server-side to a bounded number of bars
+                date_df, bin_label = column_stats(col_field).timeline()
                 
                 # Display the timeline chart
                 st.write("Data distribution over time:")
                 fig = px.bar(date_df, x='date', y='count', 
-                            title=f"Timeline for {col_field}",
+                            title=f"Timeline for {col_field} (per {bin_label})",
                             labels={'date': 'Date', 'count': 'Count'},
                             height=200)
                 fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
@@ -229,10 +470,7 @@ if df is not None:
                 
                 if len(date_range) == 2:
                     st.caption(f"Selected range: {date_range[0]} to {date_range[1]}")
-                    filtered_df = filtered_df[
-                        (filtered_df[col_field].dt.date >= date_range[0]) & 
-                        (filtered_df[col_field].dt.date <= date_range[1])
-                    ]
+                    active_filters.append(DateRangeFilter(col_field, date_range[0], date_range[1]))
         
         # ENHANCEMENT: Multiple value fields with inline filters
         st.write("**Value Fields**")
@@ -255,8 +493,7 @@ if df is not None:
         for val_field in value_fields:
             if st.checkbox(f"Filter {val_field} values", key=f"filter_{val_field}"):
                 if column_types[val_field] == "numeric":
-                    min_val = float(df[val_field].min())
-                    max_val = float(df[val_field].max())
+                    min_val, max_val = (float(value) for value in column_range(val_field))
                     
                     filter_range = st.slider(
                         f"Range for {val_field}:", 
@@ -267,8 +504,7 @@ if df is not None:
                         key=f"{val_field}_filter_range"
                     )
                     
-                    filtered_df = filtered_df[(filtered_df[val_field] >= filter_range[0]) & 
-                                          (filtered_df[val_field] <= filter_range[1])]
+                    active_filters.append(RangeFilter(val_field, filter_range[0], filter_range[1]))
         
         # Additional filters section
         with st.expander("Additional Filters", expanded=False):
@@ -286,8 +522,7 @@ if df is not None:
             for col in remaining_columns:
                 if st.checkbox(f"Filter {col}", key=f"extra_filter_{col}"):
                     if column_types[col] == "numeric":
-                        min_val = float(df[col].min())
-                        max_val = float(df[col].max())
+                        min_val, max_val = (float(value) for value in column_range(col))
                         
                         filter_range = st.slider(
                             f"Range for {col}:", 
@@ -298,37 +533,32 @@ if df is not None:
                             key=f"extra_{col}_range"
                         )
                         
-                        filtered_df = filtered_df[(filtered_df[col] >= filter_range[0]) & 
-                                              (filtered_df[col] <= filter_range[1])]
+                        active_filters.append(RangeFilter(col, filter_range[0], filter_range[1]))
                         
                     elif column_types[col] == "categorical":
-                        unique_values = sorted(df[col].unique())
+                        unique_values = column_values(col)
                         selected_values = st.multiselect(
                             f"Values for {col}:",
                             unique_values,
-                            default=unique_values,
+                            default=default_values(col),
+                            help=values_help(col),
                             key=f"extra_{col}_values"
                         )
                         
                         if selected_values:
-                            filtered_df = filtered_df[filtered_df[col].isin(selected_values)]
+                            active_filters.append(ValuesFilter(col, tuple(selected_values)))
                     
                     elif column_types[col] == "datetime":
                         try:
-                            min_date = df[col].min().date()
-                            max_date = df[col].max().date()
+                            min_date, max_date = (value.date() for value in column_range(col))
                             
-                            # Create a histogram to show data distribution over time
-                            date_counts = df[col].dt.date.value_counts().sort_index()
-                            date_df = pd.DataFrame({
-                                'date': date_counts.index,
-                                'count': date_counts.values
-                            })
+                            # Histogram of the data over time, binned server-side to a bounded number of bars
+                            date_df, bin_label = column_stats(col).timeline()
                             
                             # Display the timeline chart
                             st.write("Data distribution over time:")
                             fig = px.bar(date_df, x='date', y='count', 
-                                        title=f"Timeline for {col}",
+                                        title=f"Timeline for {col} (per {bin_label})",
                                         labels={'date': 'Date', 'count': 'Count'},
                                         height=200)
                             fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
@@ -345,31 +575,133 @@ if df is not None:
                             
                             if len(date_range) == 2:
                                 st.caption(f"Selected range: {date_range[0]} to {date_range[1]}")
-                                filtered_df = filtered_df[
-                                    (filtered_df[col].dt.date >= date_range[0]) & 
-                                    (filtered_df[col].dt.date <= date_range[1])
-                                ]
+                                active_filters.append(DateRangeFilter(col, date_range[0], date_range[1]))
                         except:
                             st.warning(f"Could not convert {col} to datetime.")
-                            unique_values = sorted(df[col].unique())
+                            unique_values = column_values(col)
                             selected_values = st.multiselect(
                                 f"Values for {col}:",
                                 unique_values,
-                                default=unique_values,
+                                default=default_values(col),
+                                help=values_help(col),
                                 key=f"extra_{col}_text"
                             )
                             
                             if selected_values:
-                                filtered_df = filtered_df[filtered_df[col].isin(selected_values)]
+                                active_filters.append(ValuesFilter(col, tuple(selected_values)))
         
         # Aggregation method
         st.write("**Aggregation Method**")
         agg_method = st.selectbox("Select aggregation method:", 
-                                ["sum", "mean", "count", "min", "max"], key="agg_method")
+                                AGG_METHODS, key="agg_method")
+
+        # Execution settings
+        with st.expander("Performance", expanded=False):
+            workers = st.number_input(
+                "Worker processes:", min_value=1, max_value=max_workers(),
+                value=default_workers(), step=1, key="workers",
+                help="Aggregate large datasets in parallel. Small inputs always use a single process."
+            )
+            cube_text = st.text_input(
+                "Rollup cubes:", value=os.environ.get("CSV_PIVOT_CUBES", ""), key="cubes", disabled=out_of_core,
+                help="Pre-aggregate the data by these dimensions so pivots over them skip the raw rows. "
+                     "Separate cubes with ';' and dimensions with ','; date columns can be bucketed, "
+                     "e.g. Region,Product,Date:month (day, week, month, quarter or year)."
+            )
+            preview_rows = int(os.environ.get("CSV_PIVOT_PREVIEW_ROWS", DEFAULT_PREVIEW_ROWS))
+            approximate_preview = st.checkbox(
+                "Approximate preview", value=preview_rows > 0, key="approximate_preview",
+                disabled=preview_rows <= 0,
+                help="On large datasets, show a pivot estimated from a random sample "
+                     "while the exact result is computed."
+            )
         
-        # Display filter status
-        filtered_rows = len(filtered_df)
-        if filtered_rows < total_rows:
+        spec = PivotSpec(row_field, col_field, value_fields, agg_method, active_filters)
+
+        # Rollup cubes are built on first use and then answer every pivot they cover
+        cubes = []
+        if cube_text.strip() and not out_of_core:
+            profiler.begin("build cubes")
+            try:
+                for dimensions in parse_cube_specs(cube_text):
+                    cubes.append(get_cube_store().get(dataset_id, dimensions, numeric_columns, dataset.load))
+            except Exception as e:
+                st.warning(f"Could not build rollup cubes: {str(e)}")
+            profiler.end()
+
+        # A cached pivot, or one a cube covers, doesn't need the raw rows, so
+        # they're only loaded on request
+        ready_result = ready_cached = None
+        if value_fields and not out_of_core:
+            ready_result = get_result_cache().get(dataset_id, spec)
+            ready_cached = ready_result is not None
+            if ready_result is None and find_cube(cubes, spec) is not None:
+                with profiler.stage("cube pivot"):
+                    ready_result = answer_from_cubes(cubes, spec)
+                get_result_cache().put(dataset_id, spec, ready_result)
+
+        # Show an estimate from a sample first when the exact pivot will take a
+        # while; the sample is read from the files, before any full column loads
+        if value_fields:
+            with main_right:
+                st.subheader("Pivot Table Result")
+                st.caption("Automatically updates as you select fields and filters")
+                preview_slot = st.empty()
+            if (approximate_preview and ready_result is None
+                    and get_result_cache().get(dataset_id, spec, streaming=out_of_core) is None):
+                profiler.begin("approximate preview")
+                # Files the date filter rules out hold no matching rows, so they aren't sampled
+                preview_source = data_source
+                if isinstance(dataset, MultiFileDataset) and not out_of_core:
+                    preview_source = [dataset.sources[i] for i in dataset.prune(active_filters)]
+                try:
+                    if preview_source and (out_of_core or estimate_rows(preview_source)
+                                           >= PREVIEW_MIN_FACTOR * preview_rows):
+                        sample, population = block_sample(preview_source, preview_rows, usecols=spec.columns,
+                                                          **READ_OPTIONS)
+                        if population > len(sample):
+                            with preview_slot.container():
+                                show_approximate_result(approximate_pivot(sample, spec, population))
+                except Exception as e:
+                    preview_slot.warning(f"Could not compute an approximate preview: {str(e)}")
+                profiler.end()
+
+        # Load only the columns the pivot and the active filters reference, and
+        # evaluate every filter into one mask so the data is sliced once
+        df = filtered_df = None
+        if out_of_core:
+            df = sample_df
+            with profiler.stage("filter preview"):
+                filtered_df = apply_filters(df, active_filters)
+        elif ready_result is None:
+            try:
+                df, filtered_df = filter_dataset(dataset, spec, mask_cache=get_mask_cache(), profiler=profiler)
+            except Exception as e:
+                st.error(f"Failed to load file: {str(e)}")
+                profiler.finish()
+                st.stop()
+        if ready_result is not None:
+            total_rows, filtered_rows = ready_result.rows_read, ready_result.rows_matched
+        else:
+            # Multi-file datasets only load the files the date filter doesn't rule out
+            total_rows = dataset.num_rows() if isinstance(dataset, MultiFileDataset) and not out_of_core else len(df)
+            filtered_rows = len(filtered_df)
+        if not out_of_core:
+            with load_status.container():
+                st.success(f"{load_message} with {total_rows} rows and {len(columns)} columns.")
+                if isinstance(dataset, MultiFileDataset) and df is not None:
+                    skipped = len(dataset.sources) - len(dataset.prune(active_filters))
+                    if skipped:
+                        st.caption(f"The date filter skipped {skipped} of {len(dataset.sources)} files "
+                                   "that hold no matching rows.")
+                usage = dataset.memory_usage(df.columns, filters=active_filters) if df is not None else None
+                if usage is not None:
+                    before, after = usage["bytes_before"].sum(), usage["bytes_after"].sum()
+                    st.caption(f"Loaded columns use {format_bytes(after)} of memory "
+                               f"({format_bytes(before)} before dtype compaction, {before / max(after, 1):.1f}× smaller).")
+
+        # Display filter status (out-of-core counts are reported with the result)
+        if filtered_rows < total_rows and not out_of_core:
             st.info(f"Filtered data: {filtered_rows} of {total_rows} rows ({filtered_rows/total_rows:.1%})")
             
         # Add a small refresh button for manual refresh
@@ -384,61 +716,82 @@ if df is not None:
                 st.dataframe(filtered_df.head(20), use_container_width=True)
                 st.info("Please select at least one value field to create a pivot table.")
             else:
-                st.subheader("Pivot Table Result")
-                st.caption("Automatically updates as you select fields and filters")
-                
-                # Create a dictionary of aggregation methods for each value field
-                agg_dict = {field: agg_method for field in value_fields}
-                
-                if col_field:
-                    # Create pivot table with multiple value fields
-                    pivot_result = pd.pivot_table(
-                        filtered_df, 
-                        values=value_fields, 
-                        index=row_field, 
-                        columns=col_field, 
-                        aggfunc=agg_method,
-                        fill_value=0
+                profiler.begin("pivot")
+                if out_of_core:
+                    # Stream the file, filtering and pre-aggregating chunk by chunk
+                    with st.spinner("Streaming file in chunks..."):
+                        streamed, cached = get_result_cache().get_or_compute(
+                            dataset_id, spec, streaming=True,
+                            compute=lambda: execute_streaming(data_source, spec, workers=workers,
+                                                              chunk_rows=OUT_OF_CORE_CHUNK_ROWS, **READ_OPTIONS)
+                        )
+                    pivot_result = streamed.table
+                    if streamed.rows_read:
+                        st.info(f"Filtered data: {streamed.rows_matched} of {streamed.rows_read} rows "
+                                f"({streamed.rows_matched/streamed.rows_read:.1%})")
+                elif ready_result is None:
+                    result, cached = get_result_cache().get_or_compute(
+                        dataset_id, spec,
+                        compute=lambda: PivotResult(pivot(filtered_df, spec, workers=workers),
+                                                    total_rows, filtered_rows)
                     )
-                    
-                    # Format the pivot table for display
-                    if len(value_fields) > 1 and isinstance(pivot_result.columns, pd.MultiIndex):
-                        # For multiple value fields, flatten the column names
-                        pivot_result.columns = [f"{val}_{col}" if col_field else val 
-                                            for val, col in pivot_result.columns]
-                    
-                    # Display the pivot table
-                    st.dataframe(pivot_result, use_container_width=True)
-                    
-                    # Show row count
-                    st.caption(f"Showing {len(pivot_result)} rows × {len(pivot_result.columns)} columns")
+                    pivot_result = result.table
                 else:
-                    # If no column field is selected, just group by row field
-                    pivot_result = filtered_df.groupby(row_field)[value_fields].agg(agg_method).reset_index()
-                    # Display the grouped data
-                    st.dataframe(pivot_result, use_container_width=True)
-                    
-                    # Show row count
-                    st.caption(f"Showing {len(pivot_result)} rows × {len(pivot_result.columns)} columns")
+                    pivot_result, cached = ready_result.table, ready_cached
+                    cube = find_cube(cubes, spec)
+                    if cube is not None and not cached:
+                        dimensions = " × ".join(column + (f" by {bucket}" if bucket else "")
+                                                for column, bucket in cube.dimensions)
+                        st.caption(f"Answered from the {dimensions} rollup cube ({len(cube)} groups)")
+                preview_slot.empty()
+                if cached:
+                    st.caption("Served from the result cache")
+
+                # Display the pivot table, paged when it's large
+                profiler.begin("render result")
+                show_paged_result(pivot_result, key="pivot_view")
                 
                 # Export option
                 if isinstance(pivot_result, pd.DataFrame) and not pivot_result.empty:
-                    csv = pivot_result.reset_index().to_csv(index=False)
-                    st.download_button(
-                        label="Download Pivot Table as CSV",
-                        data=csv,
-                        file_name='pivot_table.csv',
-                        mime='text/csv',
-                    )
+                    profiler.begin("export panel")
+                    with st.expander("Export", expanded=False):
+                        show_export_panel(pivot_result, (dataset_id, spec), active_filters)
                     
                 # Show filtered data preview in an expander
                 with st.expander("View Filtered Data", expanded=False):
-                    st.dataframe(filtered_df.head(20), use_container_width=True)
-                    st.caption(f"Showing first 20 of {len(filtered_df)} filtered rows")
+                    if filtered_df is None and st.checkbox(
+                            "Load the matching rows", key="load_filtered_rows",
+                            help="This pivot came from the result cache or a rollup cube without reading the rows."):
+                        _, filtered_df = filter_dataset(dataset, spec, mask_cache=get_mask_cache())
+                    if filtered_df is not None:
+                        st.dataframe(filtered_df.head(20), use_container_width=True)
+                        if out_of_core:
+                            st.caption(f"Showing first 20 filtered rows of the {len(sample_df)}-row preview")
+                        else:
+                            st.caption(f"Showing first 20 of {len(filtered_df)} filtered rows")
         except Exception as e:
             st.error(f"Failed to create pivot table: {str(e)}")
             # Show the filtered data on error
-            st.subheader("Filtered Data Preview")
-            st.dataframe(filtered_df.head(20), use_container_width=True)
+            if filtered_df is not None:
+                st.subheader("Filtered Data Preview")
+                st.dataframe(filtered_df.head(20), use_container_width=True)
 else:
-    st.info("Please upload a CSV file or use the sample data to get started.")
\ No newline at end of file
+    st.info("Please upload a CSV file or use the sample data to get started.")
+
+profiler.finish()
+with st.expander("Diagnostics", expanded=False):
+    enabled = st.checkbox("Record stage timings", value=env_flag("CSV_PIVOT_PROFILE"), key="profile_enabled",
+                          help="Time each stage of every rerun and record its peak memory.")
+    st.checkbox("Save a cProfile dump of each rerun", value=bool(os.environ.get("CSV_PIVOT_PROFILE_DIR")),
+                key="profile_cprofile", disabled=not enabled)
+    if profiler.records:
+        stages = profiler.frame()
+        st.caption(f"Last rerun: {stages['seconds'].sum():.3f} s across {len(stages)} stages")
+        stages["seconds"] = stages["seconds"].map("{:.4f}".format)
+        stages["peak_bytes"] = stages["peak_bytes"].map(lambda size: "" if pd.isna(size) else format_bytes(size))
+        st.dataframe(stages.rename(columns={"stage": "Stage", "seconds": "Seconds", "peak_bytes": "Peak memory"}),
+                     hide_index=True, use_container_width=True)
+    elif enabled:
+        st.caption("Stage timings will appear from the next rerun.")
+    if profiler.profile_path:
+        st.caption(f"cProfile dump written to `{profiler.profile_path}`")
\ No newline at end of file
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated rollup cubes for the CSV Pivot Table Viewer.
+
+A cube groups the whole dataset once by a chosen set of dimensions and
+keeps mergeable statistics (sum, count, min, max and row counts) of every
+numeric column per group. Any pivot whose row and column fields are cube
+dimensions, whose value fields are measured by the cube and whose filters
+only touch cube dimensions can then be answered by merging cube groups,
+which costs O(groups) instead of O(rows).
+
+Dimensions are column names. Date columns can also be bucketed, e.g.
+``Date:month``; a bucketed dimension can't be pivoted on but answers date
+filters whose bounds fall on bucket boundaries, from a much smaller cube.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from aggregation import MERGE_FUNCS, PARTIAL_STATS, empty_aggregate, finalize_partial, group_keys, layout_pivot
+from caching import LRUCache
+from compaction import widen_floats
+from filters import DateRangeFilter
+
+DEFAULT_CUBE_CACHE_MB = 512
+
+# Date granularity -> pandas period code
+GRANULARITIES = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+CUBE_STATS = ["sum", "count", "min", "max"]
+
+
+def parse_dimensions(text):
+    """Parse ``"Region,Product,Date:month"`` into ``((column, granularity), ...)``.
+
+    The granularity is None for dimensions kept at their raw values.
+    """
+    dimensions = []
+    for item in text.split(","):
+        column, _, granularity = item.strip().partition(":")
+        granularity = granularity.strip().lower() or None
+        if granularity is not None and granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown date granularity {granularity!r}; "
+                             f"expected one of {', '.join(GRANULARITIES)}")
+        if column.strip():
+            dimensions.append((column.strip(), granularity))
+    if not dimensions:
+        raise ValueError(f"No dimensions in cube definition {text!r}")
+    return tuple(dimensions)
+
+
+def parse_cube_specs(text):
+    """Parse semicolon-separated cube definitions."""
+    return [parse_dimensions(part) for part in text.split(";") if part.strip()]
+
+
+def bucket_starts(values, granularity):
+    """Map datetimes to the start of their day, week, month, quarter or year."""
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+    return values.dt.to_period(GRANULARITIES[granularity]).dt.start_time
+
+
+@dataclass
+class Cube:
+    """Mergeable statistics of a dataset grouped by ``dimensions``."""
+    dimensions: tuple
+    measures: tuple
+    # One row per group with a column per dimension, aligned with stats
+    keys: pd.DataFrame
+    # (statistic, measure) columns, plus ("rows", "") for the group size
+    stats: pd.DataFrame
+    source_rows: int
+    # Range of the raw values of bucketed date dimensions
+    date_ranges: dict = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, df, dimensions, measures):
+        """Group ``df`` by ``dimensions`` and aggregate every measure."""
+        granularity = dict(dimensions)
+        for column, bucket in dimensions:
+            if column not in df.columns:
+                raise ValueError(f"Unknown cube dimension {column!r}")
+            if bucket is not None and not pd.api.types.is_datetime64_any_dtype(df[column]):
+                raise ValueError(f"Only date columns can be bucketed by {bucket}, not {column!r}")
+        measures = [col for col in measures if col not in granularity]
+        keys = {}
+        date_ranges = {}
+        for column, bucket in dimensions:
+            if bucket is None:
+                keys[column] = df[column]
+            else:
+                values = df[column]
+                if values.dt.tz is not None:
+                    values = values.dt.tz_localize(None)
+                keys[column] = bucket_starts(values, bucket)
+                date_ranges[column] = (values.min(), values.max())
+        # Rows with missing keys still count toward pivots that don't group by them
+        grouped = widen_floats(df[measures], measures).groupby([keys[column] for column, _ in dimensions],
+                                       observed=True, dropna=False, sort=False)
+        parts = {stat: grouped.agg(stat) for stat in CUBE_STATS}
+        parts["rows"] = grouped.size().to_frame("")
+        stats = pd.concat(parts, axis=1)
+        return cls(dimensions=tuple(dimensions), measures=tuple(measures),
+                   keys=stats.index.to_frame(index=False), stats=stats.reset_index(drop=True),
+                   source_rows=len(df), date_ranges=date_ranges)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return int(self.keys.memory_usage(deep=True).sum() + self.stats.memory_usage(deep=True).sum())
+
+    def _granularity(self, column):
+        return dict(self.dimensions).get(column, "missing")
+
+    def _bucket_bounds(self, flt):
+        """Return ``(lower, upper)`` bounds on bucket starts for a date filter.
+
+        Either bound is None when it excludes nothing; returns None when a
+        bound splits a bucket that holds data on both sides.
+        """
+        granularity = self._granularity(flt.column)
+        low, high = self.date_ranges[flt.column]
+        start, stop = flt.bounds()
+        lower = upper = None
+        if start is not None and start > low:
+            lower = bucket_starts(pd.Series([start]), granularity).iloc[0]
+            if lower != start:
+                return None
+        if stop is not None and stop <= high:
+            upper = bucket_starts(pd.Series([stop]), granularity).iloc[0]
+            if upper != stop:
+                return None
+        return lower, upper
+
+    def covers(self, spec):
+        """Whether the pivot described by ``spec`` can be answered from this cube."""
+        for column in group_keys(spec.row_field, spec.col_field):
+            if self._granularity(column) is not None:
+                return False
+        if not set(spec.value_fields) <= set(self.measures):
+            return False
+        for flt in spec.filters:
+            granularity = self._granularity(flt.column)
+            if granularity == "missing":
+                return False
+            if granularity is not None:
+                if not isinstance(flt, DateRangeFilter) or self._bucket_bounds(flt) is None:
+                    return False
+        return True
+
+    def answer(self, spec):
+        """Pivot from the cube; returns ``(pivot_result, rows_matched)``.
+
+        Only valid when ``covers(spec)``.
+        """
+        mask = np.ones(len(self.keys), dtype=bool)
+        for flt in spec.filters:
+            if self._granularity(flt.column) is None:
+                mask &= flt.mask(self.keys)
+                continue
+            lower, upper = self._bucket_bounds(flt)
+            starts = self.keys[flt.column]
+            # Rows without a date never pass a date filter
+            mask &= starts.notna().to_numpy()
+            if lower is not None:
+                mask &= (starts >= lower).to_numpy()
+            if upper is not None:
+                mask &= (starts < upper).to_numpy()
+        keys, stats = self.keys[mask], self.stats[mask]
+        rows_matched = int(stats[("rows", "")].sum())
+
+        group = group_keys(spec.row_field, spec.col_field)
+        value_fields = list(spec.value_fields)
+        columns = [(stat, name) for stat in PARTIAL_STATS[spec.agg_method] for name in value_fields]
+        if not len(stats):
+            agged = empty_aggregate(spec.row_field, spec.col_field, value_fields)
+        else:
+            partial = stats[columns].groupby([keys[column] for column in group], observed=True).agg(
+                {column: MERGE_FUNCS[column[0]] for column in columns})
+            agged = finalize_partial(partial, value_fields, spec.agg_method)
+        return layout_pivot(agged, spec.row_field, spec.col_field, value_fields), rows_matched
+
+
+def find_cube(cubes, spec):
+    """Return the smallest cube that can answer ``spec``, or None."""
+    candidates = [cube for cube in cubes if cube.covers(spec)]
+    return min(candidates, key=len) if candidates else None
+
+
+class CubeStore:
+    """Size-bounded LRU of cubes keyed by ``(dataset_id, dimensions, measures)``."""
+
+    def __init__(self, max_bytes=DEFAULT_CUBE_CACHE_MB * 1024 * 1024):
+        self.cubes = LRUCache(max_bytes, sizeof=lambda cube: cube.nbytes)
+
+    def get(self, dataset_id, dimensions, measures, load):
+        """Return a cube, building it from ``load(columns)`` the first time."""
+        key = (dataset_id, tuple(dimensions), tuple(measures))
+        cube = self.cubes.get(key)
+        if cube is None:
+            columns = list(dict.fromkeys([column for column, _ in dimensions] + list(measures)))
+            cube = Cube.build(load(columns), dimensions, measures)
+            self.cubes.put(key, cube)
+        return cube
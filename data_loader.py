@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Data loading for the CSV Pivot Table Viewer.
+
+Parsing a CSV and converting its date columns is by far the most expensive
+step of a rerun, so loaded DataFrames are kept in a ``DatasetCache`` keyed by
+the file's content digest plus the parse options. Every later rerun (and
+every other session opening the same file) reuses the typed DataFrame.
+
+When the cache has a disk directory, a parsed CSV is converted once into a
+columnar file (uncompressed Arrow IPC/Feather, or Parquet). Later loads
+memory-map that file instead of parsing text again. The directory is bounded
+by a byte budget; the least recently used files are deleted first. Parquet
+and Arrow files can also be loaded directly; both need the optional
+``pyarrow`` package.
+
+``LazyDataset`` goes one step further for wide files: it reads only a small
+sample up front and loads each column the first time a pivot or filter
+references it, so memory and load time scale with the columns actually used.
+Loaded columns are compacted (see ``compaction``) before they are cached.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+import csv_parsing
+from caching import LRUCache
+from compaction import compact_dtypes, memory_report
+from csv_parsing import infer_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+DIGEST_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_CACHE_MB = 2048
+DEFAULT_DISK_CACHE_MB = 10 * 1024
+# Content digests remembered, one per file version
+DIGEST_CACHE_ENTRIES = 4096
+DEFAULT_SAMPLE_ROWS = 1000
+# Sniffed CSV schemas kept, one per file and set of explicit date formats
+SCHEMA_CACHE_ENTRIES = 256
+
+# File extensions of the supported input formats
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "feather",
+    ".feather": "feather",
+}
+COLUMNAR_FORMATS = ("feather", "parquet")
+DISK_EXTENSIONS = {"feather": ".arrow", "parquet": ".parquet", "pickle": ".pkl"}
+
+
+def has_arrow():
+    """Return True if pyarrow is installed, enabling the columnar formats."""
+    return pa is not None
+
+
+def source_format(source):
+    """Return "csv", "parquet" or "feather" based on a source's file name."""
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    extension = os.path.splitext(str(name))[1].lower()
+    return FORMAT_EXTENSIONS.get(extension, "csv")
+
+
+def file_digest(source):
+    """Return the SHA-256 hex digest of a path or binary file-like object."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            for chunk in iter(lambda: handle.read(DIGEST_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+_schemas = LRUCache(SCHEMA_CACHE_ENTRIES, sizeof=lambda schema: 1)
+
+
+def csv_schema(source, date_formats=None, sep=None, encoding=None):
+    """Return the sniffed dialect and column types of a CSV, memoized per file."""
+    fingerprint = _source_fingerprint(source)
+    key = None
+    if fingerprint is not None:
+        key = (fingerprint, json.dumps(date_formats or {}, sort_keys=True), sep, encoding)
+        schema = _schemas.get(key)
+        if schema is not None:
+            return schema
+    schema = infer_schema(source, date_formats, delimiter=sep, encoding=encoding)
+    if key is not None:
+        _schemas.put(key, schema)
+    return schema
+
+
+def read_csv(source, convert_dates=True, engine=None, date_formats=None, **read_options):
+    """Parse a CSV into a DataFrame, optionally converting date columns.
+
+    ``engine`` picks the parsing backend and ``date_formats`` gives explicit
+    formats for date columns (see ``csv_parsing``).
+    """
+    schema = csv_schema(source, date_formats, read_options.pop("sep", None), read_options.pop("encoding", None))
+    return csv_parsing.read_csv(source, schema, convert_dates=convert_dates, engine=engine, **read_options)
+
+
+def _require_arrow(fmt):
+    if pa is None:
+        raise ImportError(f"Reading {fmt} files requires the pyarrow package.")
+
+
+def write_columnar(df, path, fmt="feather"):
+    """Write ``df`` to ``path`` as Feather (Arrow IPC) or Parquet."""
+    _require_arrow(fmt)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        # Uncompressed so later reads can memory-map the buffers without copying
+        feather.write_feather(df, path, compression="uncompressed")
+
+
+def _open_columnar(source, fmt):
+    """Open a columnar source, memory-mapping it when it's a file on disk."""
+    if isinstance(source, (str, os.PathLike)):
+        return pa.memory_map(str(source), "r")
+    source.seek(0)
+    return source
+
+
+def read_columnar(source, fmt, columns=None, nrows=None):
+    """Read a Feather or Parquet source, optionally only some columns or rows."""
+    _require_arrow(fmt)
+    handle = _open_columnar(source, fmt)
+    if fmt == "parquet":
+        if nrows is not None:
+            parquet_file = pq.ParquetFile(handle)
+            batch = next(parquet_file.iter_batches(batch_size=nrows, columns=columns), None)
+            table = pa.Table.from_batches([batch]) if batch is not None else \
+                parquet_file.schema_arrow.empty_table().select(columns or parquet_file.schema_arrow.names)
+        else:
+            table = pq.read_table(handle, columns=columns)
+    else:
+        table = feather.read_table(handle, columns=columns, memory_map=False)
+        if nrows is not None:
+            table = table.slice(0, nrows)
+    return table.to_pandas()
+
+
+def read_source(source, columns=None, **options):
+    """Read any supported source into a DataFrame."""
+    fmt = source_format(source)
+    if fmt == "csv":
+        if columns is not None:
+            options["usecols"] = columns
+        return read_csv(source, **options)
+    return read_columnar(source, fmt, columns=columns, nrows=options.get("nrows"))
+
+
+def source_columns(source):
+    """Return the column names of a source without reading its rows."""
+    fmt = source_format(source)
+    if fmt == "csv":
+        return list(csv_schema(source).columns)
+    _require_arrow(fmt)
+    handle = _open_columnar(source, fmt)
+    if fmt == "parquet":
+        return pq.ParquetFile(handle).schema_arrow.names
+    return pa.ipc.open_file(handle).schema.names
+
+
+def iter_chunks(source, chunk_rows, convert_dates=True, usecols=None, **read_options):
+    """Yield a source as DataFrames of at most ``chunk_rows`` rows each.
+
+    A list of sources is read one after another; every chunk then has the
+    same columns, missing ones filled with nulls.
+    """
+    if isinstance(source, (list, tuple)):
+        columns = usecols
+        if columns is None:
+            columns = list(dict.fromkeys(col for part in source for col in source_columns(part)))
+        for part in source:
+            available = source_columns(part)
+            # Read one column anyway when the part has none of them, so its rows still count
+            part_columns = [col for col in columns if col in available] or available[:1]
+            for chunk in iter_chunks(part, chunk_rows, convert_dates, usecols=part_columns, **read_options):
+                yield chunk.reindex(columns=columns)
+        return
+
+    fmt = source_format(source)
+    if fmt != "csv":
+        _require_arrow(fmt)
+        handle = _open_columnar(source, fmt)
+        if fmt == "parquet":
+            batches = pq.ParquetFile(handle).iter_batches(batch_size=chunk_rows, columns=usecols)
+        else:
+            table = feather.read_table(handle, columns=usecols, memory_map=False)
+            batches = table.to_batches(max_chunksize=chunk_rows)
+        for batch in batches:
+            yield batch.to_pandas()
+        return
+
+    read_options.pop("engine", None)
+    schema = csv_schema(source, read_options.pop("date_formats", None),
+                        read_options.pop("sep", None), read_options.pop("encoding", None))
+    yield from csv_parsing.iter_csv(source, schema, chunk_rows, convert_dates, usecols=usecols, **read_options)
+
+
+def _source_fingerprint(source):
+    """Return a cheap identity for a source, used to avoid re-hashing it."""
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return ("path", os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    # Streamlit's UploadedFile carries a stable id for the lifetime of an upload
+    file_id = getattr(source, "file_id", None)
+    if file_id is not None:
+        return ("upload", file_id, getattr(source, "size", None))
+    return None
+
+
+class DatasetCache:
+    """Content-addressed cache of parsed DataFrames.
+
+    Entries live in a size-bounded LRU in memory and, when ``disk_dir`` is
+    given, are also written to disk so they survive process restarts. On disk
+    they are stored as ``disk_format`` ("feather", "parquet" or "pickle");
+    the columnar formats are memory-mapped when read back.
+    Files on disk are kept within ``disk_max_bytes``, evicting the least
+    recently used first; file modification times record their last use, so
+    the order survives restarts too.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, disk_dir=None, disk_format=None,
+                 disk_max_bytes=DEFAULT_DISK_CACHE_MB * 1024 * 1024):
+        self.memory = LRUCache(max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        if disk_format is None:
+            disk_format = "feather" if has_arrow() else "pickle"
+        if disk_format in COLUMNAR_FORMATS:
+            _require_arrow(disk_format)
+        elif disk_format != "pickle":
+            raise ValueError(f"Unknown cache format: {disk_format}")
+        self.disk_format = disk_format
+        self._digests = LRUCache(DIGEST_CACHE_ENTRIES, sizeof=lambda digest: 1)
+        self._disk_lock = threading.Lock()
+        # Bytes of cache files on disk; None until the first write scans the directory
+        self._disk_bytes = None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured by the CSV_PIVOT_CACHE_* variables."""
+        max_mb = int(os.environ.get("CSV_PIVOT_CACHE_MB", DEFAULT_CACHE_MB))
+        disk_dir = os.environ.get("CSV_PIVOT_CACHE_DIR") or None
+        disk_format = os.environ.get("CSV_PIVOT_CACHE_FORMAT") or None
+        disk_mb = int(os.environ.get("CSV_PIVOT_CACHE_DISK_MB", DEFAULT_DISK_CACHE_MB))
+        return cls(max_bytes=max_mb * 1024 * 1024, disk_dir=disk_dir, disk_format=disk_format,
+                   disk_max_bytes=disk_mb * 1024 * 1024)
+
+    def digest(self, source):
+        """Return the content digest of a source, memoized by its fingerprint."""
+        fingerprint = _source_fingerprint(source)
+        digest = self._digests.get(fingerprint) if fingerprint is not None else None
+        if digest is None:
+            digest = file_digest(source)
+            if fingerprint is not None:
+                self._digests.put(fingerprint, digest)
+        return digest
+
+    @staticmethod
+    def cache_key(digest, options):
+        encoded = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.sha256(f"{digest}:{encoded}".encode()).hexdigest()
+
+    def _disk_paths(self, key):
+        """Return candidate on-disk paths for ``key``, preferred format first."""
+        formats = [self.disk_format] + [fmt for fmt in DISK_EXTENSIONS if fmt != self.disk_format]
+        return [(fmt, os.path.join(self.disk_dir, f"{key}{DISK_EXTENSIONS[fmt]}")) for fmt in formats]
+
+    def _read_disk(self, key):
+        for fmt, path in self._disk_paths(key):
+            if not os.path.exists(path):
+                continue
+            try:
+                if fmt == "pickle":
+                    with open(path, "rb") as handle:
+                        df = pickle.load(handle)
+                elif has_arrow():
+                    df = read_columnar(path, fmt)
+                else:
+                    continue
+                # Mark the file as recently used for disk eviction
+                os.utime(path)
+                return df
+            except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+                continue
+        return None
+
+    def _disk_files(self):
+        """Return ``(mtime_ns, size, path)`` of every cache file on disk."""
+        extensions = tuple(DISK_EXTENSIONS.values())
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(extensions) and entry.is_file():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return files
+
+    def _prune_disk(self):
+        """Delete the least recently used cache files until the directory fits the budget.
+
+        Returns the size of the files left.
+        """
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process sharing the directory evicted it first
+                pass
+            total -= size
+        return total
+
+    def _account_disk(self, added):
+        """Add ``added`` bytes to the running disk total, pruning once it's over budget."""
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                # The first write scans the directory; later ones keep a running total
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes > self.disk_max_bytes:
+                # Rescanning also picks up files other processes added or evicted
+                self._disk_bytes = self._prune_disk()
+
+    def get(self, key):
+        """Return the cached DataFrame for ``key``, or None."""
+        df = self.memory.get(key)
+        if df is not None or not self.disk_dir:
+            return df
+        df = self._read_disk(key)
+        if df is not None:
+            self.memory.put(key, df)
+        return df
+
+    def put(self, key, df):
+        self.memory.put(key, df)
+        if not self.disk_dir:
+            return
+        fmt = self.disk_format
+        path = os.path.join(self.disk_dir, f"{key}{DISK_EXTENSIONS[fmt]}")
+        tmp_path = f"{path}.tmp"
+        if fmt in COLUMNAR_FORMATS:
+            try:
+                write_columnar(df, tmp_path, fmt)
+            except (pa.ArrowException, ValueError, TypeError):
+                # Columns Arrow can't represent (e.g. mixed-type objects) fall back to pickle
+                fmt = "pickle"
+                path = os.path.join(self.disk_dir, f"{key}{DISK_EXTENSIONS[fmt]}")
+        if fmt == "pickle":
+            with open(tmp_path, "wb") as handle:
+                pickle.dump(df, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        self._account_disk(os.path.getsize(path) - replaced)
+
+
+class LazyDataset:
+    """A dataset whose columns are read on demand.
+
+    Opening a dataset reads the first ``sample_rows`` rows, which provide the
+    column names and types for the field selectors and the data preview.
+    Full columns are read the first time ``column`` or ``load`` asks for
+    them, with a column projection (``usecols`` for CSV), and every loaded
+    column is kept in ``cache`` as its own entry, so reruns and other
+    sessions reuse it and a columnar disk cache memory-maps it later.
+
+    With ``compact`` (the default) columns are dictionary-encoded or
+    downcast as they load; ``memory_usage`` reports the savings.
+    """
+
+    def __init__(self, source, cache=None, sample_rows=DEFAULT_SAMPLE_ROWS, compact=True, **options):
+        self.source = source
+        self.cache = cache if cache is not None else DatasetCache()
+        self.compact = compact
+        self.options = options
+        self.dataset_id = self.cache.cache_key(self.cache.digest(source), options)
+        self.sample = self._cached({"sample": sample_rows, "compact": compact},
+                                   lambda: self._read(nrows=sample_rows)[0])
+        self.columns = self.sample.columns.tolist()
+
+    def _read(self, **options):
+        """Read from the source, returning the frame and its memory report."""
+        frame = read_source(self.source, **options, **self.options)
+        if not self.compact:
+            return frame, memory_report(frame, frame)
+        compacted = compact_dtypes(frame)
+        return compacted, memory_report(frame, compacted)
+
+    def _key(self, part):
+        return self.cache.cache_key(self.dataset_id, part)
+
+    def _cached(self, part, loader):
+        key = self._key(part)
+        df = self.cache.get(key)
+        if df is None:
+            df = loader()
+            self.cache.put(key, df)
+        return df
+
+    def column(self, name):
+        """Return one full column as a Series."""
+        return self.load([name])[name]
+
+    def load_id(self, filters=()):
+        """Return an id for the rows ``load`` returns; always the whole source."""
+        return self.dataset_id
+
+    def load(self, columns=None, filters=()):
+        """Return a DataFrame of ``columns`` (all by default) in dataset order.
+
+        ``filters`` lets multi-file datasets skip whole files; a single
+        source is always read in full.
+        """
+        wanted = [col for col in self.columns if columns is None or col in columns]
+        loaded = {}
+        missing = []
+        for col in wanted:
+            frame = self.cache.get(self._key({"column": col, "compact": self.compact}))
+            if frame is None:
+                missing.append(col)
+            else:
+                loaded[col] = frame
+        if missing:
+            # Read every missing column in a single pass over the source
+            frame, report = self._read(columns=missing)
+            for col in missing:
+                loaded[col] = frame[[col]]
+                self.cache.put(self._key({"column": col, "compact": self.compact}), loaded[col])
+                self.cache.put(self._key({"report": col, "compact": self.compact}),
+                               report[report["column"] == col].reset_index(drop=True))
+        if not wanted:
+            return self.sample.iloc[:0, :0]
+        return pd.concat([loaded[col] for col in wanted], axis=1)
+
+    def memory_usage(self, columns, filters=()):
+        """Return the compaction report of the loaded ``columns``, or None."""
+        reports = [self.cache.get(self._key({"report": col, "compact": self.compact})) for col in columns]
+        reports = [report for report in reports if report is not None]
+        return pd.concat(reports, ignore_index=True) if reports else None
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Chunked export of pivot results and filtered rows.
+
+Exports are written on demand, chunk by chunk, to a temporary file instead
+of being rendered into one in-memory string on every rerun. Any iterable of
+DataFrame chunks can be exported, so filtered rows can be streamed straight
+from the source file without loading it.
+
+Export files live in their own directory, and files older than
+``DEFAULT_EXPORT_MAX_AGE`` seconds are purged whenever a new export is
+written, so exports that were never downloaded don't pile up.
+"""
+
+import gzip
+import os
+import tempfile
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+DEFAULT_EXPORT_CHUNK_ROWS = 100_000
+DEFAULT_EXPORT_MAX_AGE = 60 * 60
+
+# Format key -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": ("CSV", ".csv", "text/csv"),
+    "csv.gz": ("CSV (gzip-compressed)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    """Return the export formats usable in this environment."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pa is not None]
+
+
+def frame_chunks(df, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+    """Yield ``df`` in slices of at most ``chunk_rows`` rows."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _write_csv(chunks, handle):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(handle, header=(i == 0), index=False)
+        rows += len(chunk)
+    return rows
+
+
+def _write_parquet(chunks, path):
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            # Parquet needs string column names; pivot columns can be numbers or tuples
+            chunk = chunk.set_axis([_column_name(col) for col in chunk.columns], axis=1)
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+            else:
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _column_name(col):
+    if isinstance(col, tuple):
+        return "_".join(str(part) for part in col if part != "")
+    return str(col)
+
+
+def write_chunks(chunks, path, fmt="csv"):
+    """Write DataFrame ``chunks`` to ``path`` in ``fmt``; returns the row count."""
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            return _write_csv(chunks, handle)
+    if fmt == "csv.gz":
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as handle:
+            return _write_csv(chunks, handle)
+    if fmt == "parquet":
+        if pa is None:
+            raise ImportError("Exporting Parquet files requires the pyarrow package.")
+        return _write_parquet(chunks, path)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_dir():
+    """Return the directory exports are written to (``CSV_PIVOT_EXPORT_DIR`` or a temp dir)."""
+    directory = os.environ.get("CSV_PIVOT_EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "csv_pivot_exports")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def purge_exports(directory, max_age=DEFAULT_EXPORT_MAX_AGE):
+    """Remove exports in ``directory`` last modified more than ``max_age`` seconds ago."""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        if entry.name.startswith("pivot_export_") and entry.is_file():
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # Another session purged it first
+                pass
+
+
+def export_to_tempfile(chunks, fmt="csv", directory=None, max_age=DEFAULT_EXPORT_MAX_AGE):
+    """Write ``chunks`` to a new temporary file and return ``(path, rows)``.
+
+    Older exports in the same directory are purged first.
+    """
+    directory = directory or export_dir()
+    purge_exports(directory, max_age)
+    handle, path = tempfile.mkstemp(suffix=EXPORT_FORMATS[fmt][1], prefix="pivot_export_", dir=directory)
+    os.close(handle)
+    try:
+        rows = write_chunks(chunks, path, fmt)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, rows
+
+
+def read_export(path):
+    """Return the contents of an export file, or an empty file if it was purged."""
+    try:
+        with open(path, "rb") as handle:
+            return handle.read()
+    except FileNotFoundError:
+        return b""
+
+
+def export_index(result):
+    """Return ``result`` with a meaningful index moved into columns for export."""
+    if result.index.name is not None or result.index.nlevels > 1:
+        return result.reset_index()
+    return result
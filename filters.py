@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Filter engine for the CSV Pivot Table Viewer.
+
+The filter panel collects one filter object per active widget. All of them
+are evaluated into a single boolean mask and the dataset is sliced once, so
+peak memory stays close to the size of the dataset however many filters are
+enabled.
+
+Filters are frozen dataclasses, so each one can serve as a cache key. A
+``MaskCache`` remembers the mask of every filter per dataset; when a single
+slider moves only that filter's mask is recomputed and ANDed with the cached
+masks of the others.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from caching import LRUCache
+
+DEFAULT_MASK_CACHE_MB = 512
+
+
+def _as_bool_array(values):
+    """Convert a boolean Series to a plain numpy array, treating NA as False."""
+    return values.to_numpy(dtype=bool, na_value=False)
+
+
+@dataclass(frozen=True)
+class RangeFilter:
+    """Keep rows whose numeric ``column`` lies within ``[low, high]``."""
+    column: str
+    low: float
+    high: float
+
+    def mask(self, df):
+        values = df[self.column]
+        return _as_bool_array((values >= self.low) & (values <= self.high))
+
+
+@dataclass(frozen=True)
+class ValuesFilter:
+    """Keep rows whose ``column`` is one of ``values``."""
+    column: str
+    values: frozenset
+
+    def __post_init__(self):
+        # Selection order doesn't change the result, so it mustn't change the key
+        object.__setattr__(self, "values", frozenset(self.values))
+
+    def mask(self, df):
+        return _as_bool_array(df[self.column].isin(list(self.values)))
+
+
+@dataclass(frozen=True)
+class DateRangeFilter:
+    """Keep rows whose datetime ``column`` falls on a day in ``[start, end]``.
+
+    Either bound may be None to leave that side of the range open.
+    """
+    column: str
+    start: date = None
+    end: date = None
+
+    def bounds(self):
+        """Return ``(start, stop)`` timestamps of the half-open range, None where open."""
+        start = None if self.start is None else pd.Timestamp(self.start)
+        stop = None if self.end is None else pd.Timestamp(self.end) + pd.Timedelta(days=1)
+        return start, stop
+
+    def mask(self, df):
+        values = df[self.column]
+        # Compare against timestamps instead of materializing .dt.date objects
+        start, stop = self.bounds()
+        tz = getattr(values.dt, "tz", None)
+        keep = values.notna()
+        if start is not None:
+            keep &= values >= (start if tz is None else start.tz_localize(tz))
+        if stop is not None:
+            keep &= values < (stop if tz is None else stop.tz_localize(tz))
+        return _as_bool_array(keep)
+
+
+class MaskCache:
+    """Size-bounded LRU of per-filter masks keyed by ``(dataset_id, filter)``."""
+
+    def __init__(self, max_bytes=DEFAULT_MASK_CACHE_MB * 1024 * 1024):
+        self.masks = LRUCache(max_bytes)
+
+    def mask(self, df, dataset_id, flt):
+        key = (dataset_id, flt)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = flt.mask(df)
+            # Cached masks are shared between sessions and must stay untouched
+            mask.flags.writeable = False
+            self.masks.put(key, mask)
+        return mask
+
+
+def combined_mask(df, filters, cache=None, dataset_id=None):
+    """AND every filter's mask into one array, or return None if unfiltered.
+
+    With a ``cache`` and the ``dataset_id`` of ``df``, masks of filters seen
+    before are reused instead of being evaluated again.
+    """
+    mask = None
+    for flt in filters:
+        if cache is not None and dataset_id is not None:
+            flt_mask = cache.mask(df, dataset_id, flt)
+        else:
+            flt_mask = flt.mask(df)
+        if mask is None:
+            mask = np.array(flt_mask, dtype=bool, copy=True)
+        else:
+            np.logical_and(mask, flt_mask, out=mask)
+    return mask
+
+
+def apply_filters(df, filters, cache=None, dataset_id=None):
+    """Return the rows of ``df`` matching all ``filters`` with a single slice.
+
+    When nothing is filtered out ``df`` itself is returned, so callers must
+    treat the result as read-only.
+    """
+    mask = combined_mask(df, filters, cache=cache, dataset_id=dataset_id)
+    if mask is None or mask.all():
+        return df
+    return df[mask]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-stage instrumentation for the CSV Pivot Table Viewer.
+
+A ``Profiler`` records the wall time and peak memory of each named pipeline
+stage of one rerun (loading, filter widgets, filtering, pivoting,
+rendering, ...). It can also log every stage as a JSON line and dump a
+cProfile of the whole rerun for offline analysis with ``pstats`` or
+snakeviz. A disabled profiler costs next to nothing, so the stages stay
+marked in the app permanently.
+
+Peak memory comes from ``tracemalloc``, which sees Python and NumPy
+allocations but not memory held by pyarrow. It's measured process-wide,
+so the figures are approximate while other sessions are busy.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger("csv_pivot.profile")
+
+# Reentrant: a collected profiler's finalizer may release tracing while this thread holds the lock
+_tracing_lock = threading.RLock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+
+def env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def configure_log_file(path):
+    """Append the profiler's JSON lines to ``path`` (once per process)."""
+    path = os.path.abspath(path)
+    if any(getattr(handler, "baseFilename", None) == path for handler in logger.handlers):
+        return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    seconds: float
+    # Peak traced memory above the level at the start of the stage
+    peak_bytes: int = None
+
+
+class Profiler:
+    """Time and memory recorder for the stages of one run of the pipeline."""
+
+    def __init__(self, enabled=False, trace_memory=True, log=False, profile_dir=None, context=None):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.log = enabled and log
+        # cProfile dumps are written here when set
+        self.profile_dir = profile_dir if enabled else None
+        self.context = context or {}
+        self.records = []
+        self.profile_path = None
+        self._current = None
+        self._profile = None
+        self._started = None
+        self._tracing = None
+
+    @classmethod
+    def from_env(cls, enabled=None, log=None, cprofile=None, context=None):
+        """Build a profiler; unset options fall back to ``CSV_PIVOT_PROFILE*``."""
+        enabled = env_flag("CSV_PIVOT_PROFILE") if enabled is None else enabled
+        log_path = os.environ.get("CSV_PIVOT_PROFILE_LOG")
+        if log_path and enabled:
+            configure_log_file(log_path)
+        log = bool(log_path) if log is None else log
+        profile_dir = os.environ.get("CSV_PIVOT_PROFILE_DIR")
+        if cprofile is None:
+            cprofile = bool(profile_dir)
+        profile_dir = (profile_dir or tempfile.gettempdir()) if cprofile else None
+        return cls(enabled=enabled, log=log, profile_dir=profile_dir, context=context)
+
+    def start(self):
+        """Begin a run; starts memory tracing and cProfile as configured."""
+        if not self.enabled:
+            return
+        self._started = time.perf_counter()
+        if self.trace_memory:
+            _start_tracing()
+            # A Streamlit rerun interrupted by a widget change or st.stop() never
+            # reaches finish(); releasing tracing when the profiler is collected
+            # keeps tracemalloc from staying on for good
+            self._tracing = weakref.finalize(self, _stop_tracing)
+        if self.profile_dir:
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another profiler is already active in this process
+                self._profile = None
+
+    def begin(self, name):
+        """Start stage ``name``, ending the current stage if there is one."""
+        if not self.enabled:
+            return
+        self.end()
+        baseline = None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        self._current = (name, time.perf_counter(), baseline)
+
+    def end(self):
+        """End the current stage, if any, and record it."""
+        if not self.enabled or self._current is None:
+            return
+        name, started, baseline = self._current
+        self._current = None
+        record = StageRecord(name, time.perf_counter() - started)
+        if baseline is not None:
+            record.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+        self.records.append(record)
+        if self.log:
+            logger.info(json.dumps({"event": "stage", **self.context, **asdict(record)}))
+
+    @contextmanager
+    def stage(self, name):
+        """Record the enclosed block as stage ``name``."""
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def finish(self):
+        """End the run: stop tracing and write the cProfile dump, if any."""
+        if not self.enabled or self._started is None:
+            return
+        self.end()
+        total = time.perf_counter() - self._started
+        self._started = None
+        if self._tracing is not None:
+            # Calling the finalizer releases tracing now and only once
+            self._tracing()
+            self._tracing = None
+        if self._profile is not None:
+            self._profile.disable()
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            self.profile_path = os.path.join(self.profile_dir, f"csv_pivot_{stamp}.prof")
+            self._profile.dump_stats(self.profile_path)
+            self._profile = None
+        if self.log:
+            logger.info(json.dumps({"event": "run", **self.context, "seconds": total,
+                                    "profile": self.profile_path}))
+
+    def frame(self):
+        """Return the recorded stages as a DataFrame."""
+        return pd.DataFrame([asdict(record) for record in self.records],
+                            columns=["stage", "seconds", "peak_bytes"])
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Datasets made of many files for the CSV Pivot Table Viewer.
+
+Data often lands as one file per day or per batch. ``MultiFileDataset``
+treats a list of files (from a directory, a glob pattern or a multi-file
+upload) as one dataset with the same interface as ``LazyDataset``:
+
+- Files are read in parallel, in a thread pool by default or in a process
+  pool (``executor="process"``) when CSV parsing is the bottleneck.
+- Columns are unified across files: a column missing from a file is null
+  there, and per-file categories are merged with ``union_categoricals``, so
+  every column is copied exactly once into its final array.
+- Date filters prune whole files: the Date range of each file is recorded
+  once, and files that can't hold a matching row are never read.
+"""
+
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from aggregation import bounded_map, max_workers
+from compaction import compact_column, compact_dtypes, memory_report
+from data_loader import DEFAULT_SAMPLE_ROWS, FORMAT_EXTENSIONS, DatasetCache, read_source, source_columns
+from filters import DateRangeFilter
+
+GLOB_CHARACTERS = "*?["
+
+
+def expand_sources(sources):
+    """Expand paths, directories and glob patterns into a sorted list of files.
+
+    Directories contribute every file with a supported extension.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    files = []
+    for source in sources:
+        source = str(source)
+        if os.path.isdir(source):
+            matches = [os.path.join(source, name) for name in os.listdir(source)]
+            matches = [path for path in matches
+                       if os.path.isfile(path) and os.path.splitext(path)[1].lower() in FORMAT_EXTENSIONS]
+        elif any(char in source for char in GLOB_CHARACTERS):
+            matches = [path for path in glob.glob(source, recursive=True) if os.path.isfile(path)]
+        else:
+            matches = [source]
+        files.extend(sorted(matches))
+    return list(dict.fromkeys(files))
+
+
+def resolve_sources(source):
+    """Return a list of files for a list, directory or glob; other sources as is."""
+    if isinstance(source, (list, tuple)):
+        files = expand_sources([part for part in source if isinstance(part, (str, os.PathLike))])
+        uploads = [part for part in source if not isinstance(part, (str, os.PathLike))]
+        source = files + uploads
+    elif isinstance(source, (str, os.PathLike)) and not os.path.isfile(source) and (
+            os.path.isdir(source) or any(char in str(source) for char in GLOB_CHARACTERS)):
+        source = expand_sources(source)
+    else:
+        return source
+    return source[0] if len(source) == 1 else source
+
+
+def _read_part(source, columns, compact, options):
+    """Read ``columns`` of one file (runs in pool workers).
+
+    Returns the frame and its memory report.
+    """
+    if columns == []:
+        # Read one column anyway: the file's rows still count in every column
+        frame = read_source(source, columns=source_columns(source)[:1], **options).iloc[:, :0]
+    else:
+        frame = read_source(source, columns=columns, **options)
+    frame = frame.reset_index(drop=True)
+    compacted = compact_dtypes(frame) if compact else frame
+    return compacted, memory_report(frame, compacted)
+
+
+def _null_piece(template, rows):
+    # reindex keeps categories and datetime units, and widens integers to hold nulls
+    return template.iloc[:0].reset_index(drop=True).reindex(range(rows))
+
+
+def combine_column(pieces, compact=True):
+    """Concatenate the pieces of one column read from several files."""
+    if all(isinstance(piece.dtype, pd.CategoricalDtype) for piece in pieces):
+        try:
+            return pd.Series(union_categoricals([piece.array for piece in pieces], ignore_order=True),
+                             name=pieces[0].name)
+        except TypeError:
+            # Categories of different types (e.g. numbers and text) can't be unioned
+            pass
+    if any(isinstance(piece.dtype, pd.CategoricalDtype) for piece in pieces):
+        pieces = [piece.astype(object) for piece in pieces]
+        combined = pd.concat(pieces, ignore_index=True)
+        return compact_column(combined) if compact else combined
+    return pd.concat(pieces, ignore_index=True)
+
+
+def combine_frames(frames, columns, compact=True):
+    """Stack per-file frames into one frame with ``columns``."""
+    combined = {}
+    for col in columns:
+        template = next((frame[col] for frame in frames if col in frame.columns), None)
+        if template is None:
+            template = pd.Series([], dtype=object)
+        pieces = [frame[col] if col in frame.columns else _null_piece(template, len(frame)) for frame in frames]
+        combined[col] = combine_column(pieces, compact).rename(col)
+    return pd.concat(combined.values(), axis=1) if combined else pd.DataFrame(index=range(0))
+
+
+class MultiFileDataset:
+    """Several files with the interface of ``LazyDataset``.
+
+    ``sources`` are paths or uploaded file objects. The sample takes an
+    equal share of ``sample_rows`` from every file so that it reflects all
+    partitions. ``workers`` bounds the reading pool.
+    """
+
+    def __init__(self, sources, cache=None, sample_rows=DEFAULT_SAMPLE_ROWS, compact=True,
+                 workers=None, executor="thread", **options):
+        self.sources = list(sources)
+        if not self.sources:
+            raise ValueError("A multi-file dataset needs at least one file")
+        self.cache = cache if cache is not None else DatasetCache()
+        self.compact = compact
+        self.options = options
+        self.workers = workers
+        # Uploaded files live in this process, so only paths can go to a process pool
+        on_disk = all(isinstance(source, (str, os.PathLike)) for source in self.sources)
+        self.executor = executor if on_disk else "thread"
+        digests = self._map(self.cache.digest, self.sources, processes=False)
+        self.dataset_id = self.cache.cache_key("files:" + ",".join(digests), options)
+
+        share = max(1, -(-sample_rows // len(self.sources)))
+        self.sample = self._cached({"sample": sample_rows, "compact": compact},
+                                   lambda: self._read_files(range(len(self.sources)), None, nrows=share)[0])
+        self.columns = self.sample.columns.tolist()
+
+    def _map(self, func, *iterables, processes=True):
+        if processes and self.executor == "process":
+            return bounded_map(func, *iterables, workers=self.workers or max_workers())
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(func, *iterables))
+
+    def _key(self, part):
+        return self.cache.cache_key(self.dataset_id, part)
+
+    def _cached(self, part, loader):
+        key = self._key(part)
+        df = self.cache.get(key)
+        if df is None:
+            df = loader()
+            self.cache.put(key, df)
+        return df
+
+    def _file_columns(self):
+        """Return the set of column names of every file."""
+        def compute():
+            names = self._map(source_columns, self.sources, processes=False)
+            return pd.DataFrame({"file": [i for i, cols in enumerate(names) for _ in cols],
+                                 "column": [col for cols in names for col in cols]})
+        listing = self._cached({"file_columns": True}, compute)
+        file_columns = [set() for _ in self.sources]
+        for i, col in zip(listing["file"], listing["column"]):
+            file_columns[i].add(col)
+        return file_columns
+
+    def _read_files(self, indices, columns, **options):
+        """Read ``columns`` (all by default) of the given files and combine them.
+
+        Returns the frame and its memory report.
+        """
+        indices = list(indices)
+        if columns is None:
+            wanted = [None] * len(indices)
+        else:
+            file_columns = self._file_columns()
+            wanted = [[col for col in columns if col in file_columns[i]] for i in indices]
+        results = self._map(_read_part, [self.sources[i] for i in indices], wanted,
+                            [self.compact] * len(indices), [{**self.options, **options}] * len(indices))
+        frames = [frame for frame, _ in results]
+        if columns is None:
+            columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+        combined = combine_frames(frames, columns, self.compact)
+        reports = pd.concat([report for _, report in results], ignore_index=True)
+        report = reports.groupby("column", sort=False).agg(dtype_before=("dtype_before", "first"),
+                                                           bytes_before=("bytes_before", "sum"))
+        report = report.reindex(columns).reset_index()
+        report["dtype_after"] = [str(combined[col].dtype) for col in columns]
+        report["bytes_after"] = combined.memory_usage(index=False, deep=True).to_numpy()
+        return combined, report[["column", "dtype_before", "dtype_after", "bytes_before", "bytes_after"]]
+
+    def date_ranges(self, column):
+        """Return the earliest and latest value of ``column`` in every file."""
+        def compute():
+            file_columns = self._file_columns()
+            indices = [i for i in range(len(self.sources)) if column in file_columns[i]]
+            results = self._map(_read_part, [self.sources[i] for i in indices], [[column]] * len(indices),
+                                [False] * len(indices), [self.options] * len(indices))
+            lows = [pd.NaT] * len(self.sources)
+            highs = [pd.NaT] * len(self.sources)
+            for i, (frame, _) in zip(indices, results):
+                values = frame[column]
+                if not pd.api.types.is_datetime64_any_dtype(values):
+                    # Unparsed dates can't be compared, so the file is never pruned
+                    lows[i], highs[i] = pd.Timestamp.min, pd.Timestamp.max
+                    continue
+                if values.dt.tz is not None:
+                    values = values.dt.tz_localize(None)
+                lows[i], highs[i] = values.min(), values.max()
+            return pd.DataFrame({"min": pd.to_datetime(lows), "max": pd.to_datetime(highs)})
+        return self._cached({"ranges": column}, compute)
+
+    def prune(self, filters=()):
+        """Return the indices of the files that may hold rows passing ``filters``."""
+        keep = np.ones(len(self.sources), dtype=bool)
+        for flt in filters:
+            if not isinstance(flt, DateRangeFilter) or flt.column not in self.columns:
+                continue
+            if not pd.api.types.is_datetime64_any_dtype(self.sample[flt.column]):
+                continue
+            ranges = self.date_ranges(flt.column)
+            start, stop = flt.bounds()
+            # Files without any date only hold rows the filter drops
+            keep &= ranges["max"].notna().to_numpy()
+            if start is not None:
+                keep &= (ranges["max"] >= start).to_numpy()
+            if stop is not None:
+                keep &= (ranges["min"] < stop).to_numpy()
+        return np.flatnonzero(keep).tolist()
+
+    def load_id(self, filters=()):
+        """Return an id for the rows ``load`` returns under ``filters``.
+
+        Pruning changes which rows are loaded, so per-row results such as
+        filter masks must be keyed by this id rather than ``dataset_id``.
+        """
+        selected = self.prune(filters)
+        if len(selected) == len(self.sources):
+            return self.dataset_id
+        return self._key({"files": selected})
+
+    def _file_key(self, part, index):
+        return self._key({**part, "file": index, "compact": self.compact})
+
+    def _remember_rows(self, index, rows):
+        self.cache.put(self._file_key({"rows": True}, index), pd.DataFrame({"rows": [rows]}))
+
+    def _file_rows(self, indices):
+        """Return the number of rows of each of the given files."""
+        counts = {}
+        for i in indices:
+            cached = self.cache.get(self._file_key({"rows": True}, i))
+            if cached is not None:
+                counts[i] = int(cached["rows"].iloc[0])
+        missing = [i for i in indices if i not in counts]
+        if missing:
+            # Reads a single column of each file
+            results = self._map(_read_part, [self.sources[i] for i in missing], [[]] * len(missing),
+                                [False] * len(missing), [self.options] * len(missing))
+            for i, (frame, _) in zip(missing, results):
+                counts[i] = len(frame)
+                self._remember_rows(i, len(frame))
+        return [counts[i] for i in indices]
+
+    def num_rows(self):
+        """Return the number of rows in all files."""
+        return sum(self._file_rows(range(len(self.sources))))
+
+    def column(self, name):
+        """Return one full column as a Series."""
+        return self.load([name])[name]
+
+    def _file_frames(self, indices, columns):
+        """Return one frame per file with the ``columns`` it has.
+
+        Every column of every file is cached on its own, so a new file
+        selection only reads the files and columns not loaded before.
+        """
+        file_columns = self._file_columns()
+        pieces = {i: {} for i in indices}
+        missing = {}
+        for i in indices:
+            for col in columns:
+                if col not in file_columns[i]:
+                    continue
+                piece = self.cache.get(self._file_key({"column": col}, i))
+                if piece is None:
+                    missing.setdefault(i, []).append(col)
+                else:
+                    pieces[i][col] = piece
+        if missing:
+            # Read the missing columns of all files in one parallel pass
+            order = list(missing)
+            results = self._map(_read_part, [self.sources[i] for i in order], [missing[i] for i in order],
+                                [self.compact] * len(order), [self.options] * len(order))
+            for i, (frame, report) in zip(order, results):
+                self._remember_rows(i, len(frame))
+                for col in missing[i]:
+                    pieces[i][col] = frame[[col]]
+                    self.cache.put(self._file_key({"column": col}, i), pieces[i][col])
+                    self.cache.put(self._file_key({"report": col}, i),
+                                   report[report["column"] == col].reset_index(drop=True))
+        empty = [i for i in indices if not pieces[i]]
+        rows = dict(zip(empty, self._file_rows(empty)))
+        return [pd.concat([pieces[i][col] for col in columns if col in pieces[i]], axis=1) if pieces[i]
+                else pd.DataFrame(index=range(rows[i])) for i in indices]
+
+    def load(self, columns=None, filters=()):
+        """Return a DataFrame of ``columns`` (all by default) in dataset order.
+
+        Files that ``filters`` rule out are skipped, so the frame holds a
+        superset of the matching rows, not the whole dataset; ``load_id``
+        identifies it.
+        """
+        wanted = [col for col in self.columns if columns is None or col in columns]
+        if not wanted:
+            return self.sample.iloc[:0, :0]
+        selected = self.prune(filters)
+        return combine_frames(self._file_frames(selected, wanted), wanted, self.compact)
+
+    def memory_usage(self, columns, filters=()):
+        """Return the compaction report of the loaded ``columns``, or None."""
+        reports = [self.cache.get(self._file_key({"report": col}, i))
+                   for i in self.prune(filters) for col in columns]
+        reports = [report for report in reports if report is not None]
+        if not reports:
+            return None
+        reports = pd.concat(reports, ignore_index=True)
+        return reports.groupby("column", sort=False).agg(
+            dtype_before=("dtype_before", "first"), dtype_after=("dtype_after", "first"),
+            bytes_before=("bytes_before", "sum"), bytes_after=("bytes_after", "sum")).reset_index()
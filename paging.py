@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Windowed access to large pivot results for the CSV Pivot Table Viewer.
+
+Pivot results stay on the server; only the visible window of rows and
+columns is handed to ``st.dataframe``. Sorting and top-N selection work on
+row positions so that nothing but the returned window gets materialized.
+"""
+
+import math
+
+import numpy as np
+
+
+def sorted_positions(df, sort_column=None, descending=False, top_n=None):
+    """Return the row positions of ``df`` in display order.
+
+    ``sort_column`` is a column position (None keeps the current order);
+    missing values always sort last. ``top_n`` keeps only the first rows.
+    """
+    if sort_column is None:
+        positions = np.arange(len(df))
+    else:
+        values = df.iloc[:, sort_column].reset_index(drop=True)
+        positions = values.sort_values(ascending=not descending, na_position="last",
+                                       kind="stable").index.to_numpy()
+    if top_n:
+        positions = positions[:top_n]
+    return positions
+
+
+def page_count(total_rows, page_size):
+    return max(1, math.ceil(total_rows / page_size))
+
+
+def window_frame(df, positions, page, page_size, col_start=0, col_count=None):
+    """Return one page (1-based) of rows at ``positions`` and a column window."""
+    start = (page - 1) * page_size
+    rows = positions[start:start + page_size]
+    col_stop = len(df.columns) if col_count is None else col_start + col_count
+    return df.iloc[rows, col_start:col_stop]
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Headless pivot engine for the CSV Pivot Table Viewer.
+
+Everything the viewer does to data (loading, filtering and pivoting) is
+available here without Streamlit or Plotly, so pivots can be scripted,
+benchmarked and run in batch jobs. The Streamlit app is a thin client of
+this module.
+
+Example:
+    python pivot_engine.py sales.csv --rows Region --cols Product \\
+        --values Sales --agg sum --filter "Region=North,South" -o pivot.csv
+
+Inputs may be directories or glob patterns. Several input files are pivoted
+in parallel with ``--jobs``; each result is written to ``--output-dir`` as
+``<input stem>.pivot.<extension>``. With ``--combine`` all inputs form one
+dataset instead.
+
+A ``ResultCache`` memoizes finished pivots under a canonical hash of the
+dataset id and the complete spec, so repeated queries skip the pivot.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import date
+
+import pandas as pd
+
+from aggregation import AGG_METHODS, DEFAULT_CHUNK_ROWS, chunked_pivot, default_workers, parallel_pivot
+from caching import LRUCache
+from column_stats import column_kind
+from csv_parsing import CSV_ENGINES, parse_date_formats
+from cubes import find_cube
+from data_loader import LazyDataset
+from export import EXPORT_FORMATS, export_index, frame_chunks, write_chunks
+from filters import DateRangeFilter, RangeFilter, ValuesFilter, apply_filters
+from instrumentation import Profiler
+from multi_file import MultiFileDataset, expand_sources, resolve_sources
+
+DEFAULT_RESULT_CACHE_MB = 256
+
+
+@dataclass(frozen=True)
+class PivotSpec:
+    """What to pivot: grouping fields, value fields, aggregation and filters."""
+    row_field: str
+    col_field: str = None
+    value_fields: tuple = ()
+    agg_method: str = "sum"
+    filters: tuple = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, "value_fields", tuple(self.value_fields))
+        object.__setattr__(self, "filters", tuple(self.filters))
+        if self.agg_method not in AGG_METHODS:
+            raise ValueError(f"Unknown aggregation method {self.agg_method!r}; "
+                             f"expected one of {', '.join(AGG_METHODS)}")
+
+    @property
+    def columns(self):
+        """Every column the pivot and its filters read, without duplicates."""
+        columns = [self.row_field] + ([self.col_field] if self.col_field else [])
+        columns += list(self.value_fields) + [flt.column for flt in self.filters]
+        return list(dict.fromkeys(columns))
+
+
+@dataclass
+class PivotResult:
+    """A pivot table plus how many rows were read and matched the filters."""
+    table: pd.DataFrame
+    rows_read: int
+    rows_matched: int
+    # The matching rows, when the pivot ran in memory
+    filtered: pd.DataFrame = field(default=None, repr=False)
+
+
+def _canonical(value):
+    """Return a JSON-ready form of a spec value that ignores incidental ordering."""
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(item) for item in value), key=lambda item: json.dumps(item, default=str))
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        # NumPy scalars hash like the Python values they hold
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        # 5 and 5.0 select the same rows
+        return int(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def spec_key(dataset_id, spec, streaming=False):
+    """Return a canonical hash of a dataset and a complete pivot spec."""
+    filters = sorted(({"type": type(flt).__name__,
+                       **{item.name: _canonical(getattr(flt, item.name)) for item in fields(flt)}}
+                      for flt in spec.filters),
+                     key=lambda item: json.dumps(item, sort_keys=True, default=str))
+    payload = {
+        "dataset": dataset_id,
+        "row_field": spec.row_field,
+        "col_field": spec.col_field,
+        # Value field order decides the column order of the result, so it's kept
+        "value_fields": list(spec.value_fields),
+        "agg_method": spec.agg_method,
+        "filters": filters,
+        "streaming": streaming,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU of finished pivots keyed by ``spec_key``.
+
+    Cached tables are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_RESULT_CACHE_MB * 1024 * 1024):
+        self.results = LRUCache(max_bytes)
+
+    def get(self, dataset_id, spec, streaming=False):
+        cached = self.results.get(spec_key(dataset_id, spec, streaming))
+        return None if cached is None else PivotResult(*cached)
+
+    def put(self, dataset_id, spec, result, streaming=False):
+        # The matching rows aren't kept; they'd dwarf the pivot itself
+        self.results.put(spec_key(dataset_id, spec, streaming),
+                         (result.table, result.rows_read, result.rows_matched))
+
+    def get_or_compute(self, dataset_id, spec, compute, streaming=False):
+        """Return ``(result, True)`` from the cache or ``(compute(), False)``."""
+        result = self.get(dataset_id, spec, streaming)
+        if result is not None:
+            return result, True
+        result = compute()
+        self.put(dataset_id, spec, result, streaming)
+        return result, False
+
+
+def open_dataset(source, cache=None, executor="thread", **options):
+    """Open a CSV, Parquet or Arrow source; columns are read on demand.
+
+    A list of sources, a directory or a glob pattern opens a multi-file
+    dataset, read in a ``executor`` ("thread" or "process") pool.
+    """
+    source = resolve_sources(source)
+    if isinstance(source, list):
+        return MultiFileDataset(source, cache=cache, executor=executor, **options)
+    return LazyDataset(source, cache=cache, **options)
+
+
+def filter_dataset(dataset, spec, mask_cache=None, profiler=None):
+    """Load the columns ``spec`` needs; return ``(all rows, matching rows)``."""
+    profiler = profiler or Profiler()
+    with profiler.stage("load columns"):
+        # Multi-file datasets skip files the date filters rule out
+        frame = dataset.load(spec.columns, filters=spec.filters)
+    with profiler.stage("filter"):
+        # Masks are positional, so they're keyed by the rows actually loaded
+        filtered = apply_filters(frame, spec.filters, cache=mask_cache, dataset_id=dataset.load_id(spec.filters))
+    return frame, filtered
+
+
+def pivot(filtered, spec, workers=1):
+    """Pivot already-filtered rows according to ``spec``."""
+    return parallel_pivot(filtered, spec.row_field, spec.col_field, list(spec.value_fields),
+                          spec.agg_method, workers=workers)
+
+
+def answer_from_cubes(cubes, spec):
+    """Pivot from the smallest rollup cube covering ``spec``; None if none does."""
+    cube = find_cube(cubes, spec)
+    if cube is None:
+        return None
+    table, rows_matched = cube.answer(spec)
+    return PivotResult(table, cube.source_rows, rows_matched)
+
+
+def execute(dataset, spec, workers=1, mask_cache=None, profiler=None, cubes=()):
+    """Filter and pivot a dataset in memory, or answer from a rollup cube."""
+    profiler = profiler or Profiler()
+    if cubes:
+        with profiler.stage("cube pivot"):
+            result = answer_from_cubes(cubes, spec)
+        if result is not None:
+            return result
+    frame, filtered = filter_dataset(dataset, spec, mask_cache=mask_cache, profiler=profiler)
+    with profiler.stage("pivot"):
+        table = pivot(filtered, spec, workers)
+    return PivotResult(table, len(frame), len(filtered), filtered)
+
+
+def execute_streaming(source, spec, workers=1, chunk_rows=DEFAULT_CHUNK_ROWS, **read_options):
+    """Filter and pivot a source chunk by chunk, without loading it."""
+    table, rows_read, rows_matched = chunked_pivot(
+        resolve_sources(source), spec.row_field, spec.col_field, list(spec.value_fields), spec.agg_method,
+        filters=spec.filters, chunk_rows=chunk_rows, workers=workers, **read_options
+    )
+    return PivotResult(table, rows_read, rows_matched)
+
+
+def parse_filter(text, sample):
+    """Parse a command-line filter using ``sample`` for the column types.
+
+    ``COLUMN=A,B`` keeps rows whose value is A or B. ``COLUMN:LOW..HIGH``
+    keeps a numeric or date range; either bound may be left out.
+    """
+    if "=" in text and (":" not in text or text.index("=") < text.index(":")):
+        column, values = text.split("=", 1)
+        kind = "values"
+    elif ":" in text and ".." in text:
+        column, bounds = text.split(":", 1)
+        low, high = bounds.split("..", 1)
+        kind = "range"
+    else:
+        raise ValueError(f"Invalid filter {text!r}; use COLUMN=A,B or COLUMN:LOW..HIGH")
+    if column not in sample.columns:
+        raise ValueError(f"Unknown filter column {column!r}")
+
+    column_type = column_kind(sample[column])
+    if kind == "values":
+        values = values.split(",")
+        if column_type == "numeric":
+            values = [float(value) for value in values]
+        return ValuesFilter(column, values)
+    if column_type == "datetime":
+        return DateRangeFilter(column,
+                               date.fromisoformat(low) if low else None,
+                               date.fromisoformat(high) if high else None)
+    if column_type == "numeric":
+        return RangeFilter(column, float(low) if low else -math.inf, float(high) if high else math.inf)
+    raise ValueError(f"Range filters need a numeric or date column, not {column!r}")
+
+
+def output_format(path, fmt=None):
+    """Return the export format for ``path``: explicit, or from its extension."""
+    if fmt:
+        return fmt
+    for key, (_, extension, _) in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1][1])):
+        if str(path).endswith(extension):
+            return key
+    return "csv"
+
+
+def write_result(table, path, fmt=None):
+    """Write a pivot table to ``path`` ("-" for CSV on stdout)."""
+    table = export_index(table)
+    if path == "-":
+        table.to_csv(sys.stdout, index=False)
+        return
+    write_chunks(frame_chunks(table), path, output_format(path, fmt))
+
+
+def input_label(path):
+    return path if isinstance(path, str) else f"{len(path)} files"
+
+
+def output_stems(paths):
+    """Name the output of each input by its path below the inputs' common directory.
+
+    ``a/data.csv`` and ``b/data.csv`` become ``a/data`` and ``b/data``; inputs
+    that differ only in their extension keep it, e.g. ``data.csv``.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    relative = [os.path.relpath(path, root) for path in paths]
+    stems = [os.path.splitext(path)[0] for path in relative]
+    return [path if stems.count(stem) > 1 else stem for path, stem in zip(relative, stems)]
+
+
+def run_file(path, args, output):
+    """Pivot one input (a file or a list of files) as described by the parsed CLI ``args``."""
+    profiler = Profiler(enabled=args.profile, context={"input": input_label(path)})
+    profiler.start()
+    read_options = {}
+    if args.csv_engine:
+        read_options["engine"] = args.csv_engine
+    if args.date_format:
+        read_options["date_formats"] = parse_date_formats(";".join(args.date_format))
+    with profiler.stage("open dataset"):
+        # Streaming still needs the column types of a sample to parse the filters
+        dataset = open_dataset(path, sample_rows=1000, **read_options)
+        sample = dataset.sample
+    spec = PivotSpec(args.rows, args.cols, args.values, args.agg,
+                     [parse_filter(text, sample) for text in args.filter])
+    if args.out_of_core:
+        with profiler.stage("stream pivot"):
+            result = execute_streaming(path, spec, workers=args.workers, chunk_rows=args.chunk_rows,
+                                       **read_options)
+    else:
+        result = execute(dataset, spec, workers=args.workers, profiler=profiler)
+    with profiler.stage("write result"):
+        write_result(result.table, output, args.format)
+    profiler.finish()
+    if args.profile:
+        print(f"{input_label(path)}:\n{profiler.frame().to_string(index=False)}", file=sys.stderr)
+    return input_label(path), output, result.rows_read, result.rows_matched
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Pivot CSV, Parquet or Arrow files without the web UI.")
+    parser.add_argument("inputs", nargs="+", help="Input files, directories or glob patterns")
+    parser.add_argument("--combine", action="store_true", help="Pivot all inputs together as one dataset")
+    parser.add_argument("--rows", required=True, help="Row field")
+    parser.add_argument("--cols", help="Column field (optional)")
+    parser.add_argument("--values", nargs="+", required=True, help="Value fields")
+    parser.add_argument("--agg", default="sum", choices=AGG_METHODS, help="Aggregation method")
+    parser.add_argument("--filter", action="append", default=[], metavar="SPEC",
+                        help="COLUMN=A,B or COLUMN:LOW..HIGH; may be repeated")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Output file for a single input ('-' writes CSV to stdout)")
+    parser.add_argument("--output-dir", help="Output directory, required for several inputs")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), help="Output format (default: from extension)")
+    parser.add_argument("--csv-engine", choices=CSV_ENGINES,
+                        help="CSV parser (default: CSV_PIVOT_CSV_ENGINE, or pyarrow when installed)")
+    parser.add_argument("--date-format", action="append", default=[], metavar="COLUMN=FORMAT",
+                        help="strptime format of a date column, e.g. Date=%%d/%%m/%%Y; may be repeated")
+    parser.add_argument("--out-of-core", action="store_true", help="Stream inputs in chunks instead of loading them")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk when streaming")
+    parser.add_argument("--workers", type=int, help="Aggregation processes per input")
+    parser.add_argument("--jobs", type=int, default=1, help="Inputs processed in parallel")
+    parser.add_argument("--profile", action="store_true", help="Print the time and peak memory of each stage")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    inputs = expand_sources(args.inputs)
+    if not inputs:
+        parser.error("no input files found")
+    if args.combine:
+        inputs = [inputs]
+    if len(inputs) > 1 and not args.output_dir:
+        parser.error("--output-dir is required with several inputs")
+    if args.workers is None:
+        # Parallelize across files first; nested process pools would oversubscribe
+        args.workers = default_workers() if args.jobs == 1 else 1
+
+    if not args.output_dir:
+        run_file(inputs[0], args, args.output)
+        return 0
+
+    extension = EXPORT_FORMATS[args.format or "csv"][1]
+    stems = ["combined"] if args.combine else output_stems(inputs)
+    outputs = [os.path.join(args.output_dir, stem + ".pivot" + extension) for stem in stems]
+    for output in outputs:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(run_file, inputs, [args] * len(outputs), outputs))
+    else:
+        results = [run_file(path, args, output) for path, output in zip(inputs, outputs)]
+    for path, output, rows_read, rows_matched in results:
+        print(f"{path}: {rows_matched} of {rows_read} rows -> {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Approximate pivots from row samples for the CSV Pivot Table Viewer.
+
+On large datasets the exact pivot can take a while, so the viewer first
+shows an estimate computed from a random sample of rows and then replaces
+it with the exact result. Sums and counts are scaled up by
+``population / sample``; means are sample means; min and max are the sample
+extremes. Every estimated cell gets a 95% margin of error, assuming the
+sampled rows are independent of each other.
+
+``uniform_sample`` draws rows from a frame that is already in memory.
+``estimate_rows`` tells from a file's size whether a preview is worth it.
+``block_sample`` reads a sample straight from files without scanning them:
+a CSV is sampled as short runs of lines starting at random byte offsets,
+Parquet by random row groups and Arrow by random record batches. The
+sample of several files is split between them in proportion to their size.
+"""
+
+import io
+import math
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import csv_parsing
+from aggregation import empty_aggregate, group_keys, layout_pivot
+from data_loader import csv_schema, read_csv, source_columns, source_format
+from filters import apply_filters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+DEFAULT_PREVIEW_ROWS = 100_000
+DEFAULT_BLOCKS = 64
+# Normal quantile of a two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+def uniform_sample(df, size, seed=0):
+    """Return ``size`` rows of ``df`` drawn without replacement, in order."""
+    if len(df) <= size:
+        return df
+    positions = np.sort(np.random.default_rng(seed).choice(len(df), size, replace=False))
+    return df.take(positions)
+
+
+def _source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, "size", None)
+    if size is None:
+        size = source.seek(0, os.SEEK_END)
+    return size
+
+
+def estimate_rows(source, probe_lines=1000):
+    """Estimate the number of rows of a source (or list of sources) without reading it.
+
+    A CSV's row count is estimated from the length of its first
+    ``probe_lines`` lines; columnar files record theirs.
+    """
+    if isinstance(source, (list, tuple)):
+        return sum(estimate_rows(part, probe_lines) for part in source)
+    fmt = source_format(source)
+    if fmt == "csv":
+        handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+        try:
+            handle.seek(0)
+            handle.readline()
+            start = handle.tell()
+            probe = [line for line in (handle.readline() for _ in range(probe_lines)) if line]
+            end = handle.seek(0, os.SEEK_END)
+        finally:
+            if handle is not source:
+                handle.close()
+        return round((end - start) * len(probe) / sum(map(len, probe))) if probe else 0
+    if pa is None:
+        raise ImportError(f"Reading {fmt} files requires the pyarrow package.")
+    if isinstance(source, (str, os.PathLike)):
+        handle = pa.memory_map(str(source), "r")
+    else:
+        source.seek(0)
+        handle = source
+    if fmt == "parquet":
+        return pq.ParquetFile(handle).metadata.num_rows
+    reader = pa.ipc.open_file(handle)
+    return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def _csv_blocks(source, size, blocks, rng, usecols, read_options):
+    """Sample a CSV as runs of lines from random byte offsets.
+
+    The row count is estimated from the average length of the sampled lines.
+    """
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        handle.seek(0)
+        header = handle.readline()
+        start = handle.tell()
+        end = handle.seek(0, os.SEEK_END)
+        lines_per_block = max(1, math.ceil(size / blocks))
+        handle.seek(start)
+        probe = [line for line in (handle.readline() for _ in range(min(lines_per_block, 1000))) if line]
+        if not probe or (end - start) * len(probe) <= 2 * size * sum(map(len, probe)):
+            # Small enough to read whole
+            df = read_csv(source, usecols=usecols, **read_options)
+            return df, len(df)
+
+        # Every block is parsed with the types and date formats of the file's prefix
+        schema = csv_schema(source, read_options.get("date_formats"), read_options.get("sep"),
+                            read_options.get("encoding"))
+        frames = []
+        lines_read = bytes_read = 0
+        position = start
+        for offset in np.sort(rng.integers(start, end, blocks)):
+            if offset > position:
+                handle.seek(offset)
+                # The first line is most likely partial
+                handle.readline()
+            lines = [line for line in (handle.readline() for _ in range(lines_per_block)) if line]
+            position = handle.tell()
+            if not lines:
+                continue
+            lines_read += len(lines)
+            bytes_read += sum(map(len, lines))
+            if not lines[-1].endswith(b"\n"):
+                lines[-1] += b"\n"
+            try:
+                frames.append(csv_parsing.read_csv(io.BytesIO(header + b"".join(lines)), schema,
+                                                   engine=read_options.get("engine"), usecols=usecols))
+            except (pd.errors.ParserError, ValueError):
+                # The block started inside a quoted field spanning several lines
+                continue
+        if not frames:
+            df = read_csv(source, usecols=usecols, **read_options)
+            return df, len(df)
+        return pd.concat(frames, ignore_index=True), round((end - start) * lines_read / bytes_read)
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def _columnar_blocks(source, fmt, size, rng, usecols):
+    """Sample random Parquet row groups or Arrow record batches.
+
+    Columnar files record their row count, so it is exact.
+    """
+    if pa is None:
+        raise ImportError(f"Reading {fmt} files requires the pyarrow package.")
+    if isinstance(source, (str, os.PathLike)):
+        handle = pa.memory_map(str(source), "r")
+    else:
+        source.seek(0)
+        handle = source
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(handle)
+        sizes = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+        read = lambda chosen: parquet_file.read_row_groups(chosen, columns=usecols)
+    else:
+        reader = pa.ipc.open_file(handle)
+        sizes = [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+        read = lambda chosen: pa.Table.from_batches([reader.get_batch(i) for i in chosen], reader.schema)
+    chosen = []
+    rows = 0
+    for i in rng.permutation(len(sizes)):
+        if rows >= size:
+            break
+        chosen.append(int(i))
+        rows += sizes[i]
+    table = read(sorted(chosen))
+    if usecols is not None:
+        table = table.select(usecols)
+    return uniform_sample(table.to_pandas(), size, seed=int(rng.integers(2 ** 32))), sum(sizes)
+
+
+def block_sample(source, size=DEFAULT_PREVIEW_ROWS, blocks=DEFAULT_BLOCKS, seed=0, usecols=None,
+                 **read_options):
+    """Read about ``size`` random rows of a source without scanning it.
+
+    ``source`` may also be a list of sources. ``read_options`` (e.g.
+    ``date_formats``) apply to CSVs as in ``read_source``. Returns the sample
+    and the (estimated) number of rows in the whole source.
+    """
+    rng = np.random.default_rng(seed)
+    if isinstance(source, (list, tuple)):
+        sizes = np.array([_source_size(part) for part in source], dtype=float)
+        shares = np.ceil(size * sizes / max(sizes.sum(), 1)).astype(int)
+        frames = []
+        population = 0
+        for part, share in zip(source, shares):
+            part_columns = None
+            if usecols is not None:
+                available = source_columns(part)
+                # Read one column anyway when the file has none of them, so its rows still count
+                part_columns = [col for col in usecols if col in available] or available[:1]
+            frame, rows = block_sample(part, max(1, share), max(1, math.ceil(blocks * share / size)),
+                                       seed=int(rng.integers(2 ** 32)), usecols=part_columns, **read_options)
+            frames.append(frame if usecols is None else frame.reindex(columns=usecols))
+            population += rows
+        return pd.concat(frames, ignore_index=True), population
+
+    fmt = source_format(source)
+    if fmt == "csv":
+        return _csv_blocks(source, size, blocks, rng, usecols, read_options)
+    return _columnar_blocks(source, fmt, size, rng, usecols)
+
+
+@dataclass
+class ApproximateResult:
+    """A pivot estimated from a sample, with a 95% margin of error per cell."""
+    table: pd.DataFrame
+    # Same shape as ``table``; None for min and max, which have no margin
+    margin: pd.DataFrame
+    sample_rows: int
+    population_rows: int
+    # Estimated number of rows passing the filters
+    rows_matched: int
+    # Margin relative to the estimate of every non-zero cell
+    relative_errors: np.ndarray
+
+
+def _relative_errors(estimate, margin):
+    if margin is None:
+        return np.array([])
+    values, margins = estimate.to_numpy(dtype=float), margin.to_numpy(dtype=float)
+    valid = (values != 0) & ~np.isnan(values) & ~np.isnan(margins)
+    return np.abs(margins[valid] / values[valid])
+
+
+def approximate_pivot(sample, spec, population_rows):
+    """Estimate the pivot described by ``spec`` from ``sample``.
+
+    ``sample`` is a uniform sample of the unfiltered dataset, which holds
+    ``population_rows`` rows; the filters are applied to the sample here.
+    """
+    n = len(sample)
+    population_rows = max(population_rows, n)
+    scale = population_rows / n if n else 0.0
+    # Finite population correction: a sample of everything has no error
+    fpc = 1 - n / population_rows if population_rows else 0.0
+    filtered = apply_filters(sample, spec.filters)
+    keys = group_keys(spec.row_field, spec.col_field)
+    value_fields = list(spec.value_fields)
+
+    if not len(filtered):
+        empty = layout_pivot(empty_aggregate(spec.row_field, spec.col_field, value_fields),
+                             spec.row_field, spec.col_field, value_fields)
+        return ApproximateResult(empty, None if spec.agg_method in ("min", "max") else empty.copy(),
+                                 n, population_rows, 0, np.array([]))
+
+    by = [filtered[key] for key in keys]
+    values = filtered[value_fields].astype("float64")
+    if spec.agg_method == "count":
+        values = values.notna().astype("float64")
+    if spec.agg_method in ("min", "max"):
+        estimate = values.groupby(by, observed=True).agg(spec.agg_method)
+        margin = None
+    else:
+        sums = values.groupby(by, observed=True).sum()
+        squares = (values ** 2).groupby(by, observed=True).sum()
+        if spec.agg_method == "mean":
+            counts = values.groupby(by, observed=True).count()
+            estimate = sums / counts
+            variance = ((squares - sums ** 2 / counts) / (counts - 1)).clip(lower=0)
+            margin = Z_95 * np.sqrt(variance / counts * fpc)
+        else:
+            # A sum is population_rows times the mean, over every sampled row,
+            # of the value where the row is in the cell and passes the filters
+            # and 0 elsewhere
+            variance = ((squares - sums ** 2 / n) / max(n - 1, 1)).clip(lower=0)
+            estimate = sums * scale
+            margin = Z_95 * population_rows * np.sqrt(variance / n * fpc)
+            if spec.agg_method == "count":
+                estimate = estimate.round()
+    relative_errors = _relative_errors(estimate, margin)
+    if margin is not None:
+        margin = layout_pivot(margin, spec.row_field, spec.col_field, value_fields)
+
+    return ApproximateResult(
+        table=layout_pivot(estimate, spec.row_field, spec.col_field, value_fields),
+        margin=margin,
+        sample_rows=n,
+        population_rows=population_rows,
+        rows_matched=round(len(filtered) * scale),
+        relative_errors=relative_errors,
+    )
@@ -0,0 +1,50 @@
+"""The chunked and parallel pivots must match ``pivot_frame`` on the same rows."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregation import AGG_METHODS, chunked_pivot, parallel_pivot, pivot_frame
+
+VALUE_FIELDS = ["Sales", "Quantity"]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 500
+    df = pd.DataFrame({
+        "Region": rng.choice(["North", "South", "East", "West"], rows),
+        "Product": rng.choice(["A", "B", "C"], rows),
+        "Sales": rng.integers(0, 10_000, rows) / 4,
+        "Quantity": rng.integers(1, 50, rows),
+    })
+    # Missing values must be skipped the same way everywhere
+    df.loc[::17, "Sales"] = np.nan
+    return df
+
+
+def assert_same_pivot(actual, expected):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False, check_index_type=False,
+                                  check_column_type=False)
+
+
+@pytest.mark.parametrize("col_field", [None, "Product"])
+@pytest.mark.parametrize("agg_method", AGG_METHODS)
+def test_chunked_pivot_matches_pivot_frame(frame, tmp_path, agg_method, col_field):
+    path = tmp_path / "data.csv"
+    frame.to_csv(path, index=False)
+    expected = pivot_frame(frame, "Region", col_field, VALUE_FIELDS, agg_method)
+    result, rows_read, rows_matched = chunked_pivot(str(path), "Region", col_field, VALUE_FIELDS, agg_method,
+                                                    chunk_rows=64)
+    assert rows_read == rows_matched == len(frame)
+    assert_same_pivot(result, expected)
+
+
+@pytest.mark.parametrize("col_field", [None, "Product"])
+@pytest.mark.parametrize("agg_method", AGG_METHODS)
+def test_parallel_pivot_matches_pivot_frame(frame, agg_method, col_field):
+    expected = pivot_frame(frame, "Region", col_field, VALUE_FIELDS, agg_method)
+    result = parallel_pivot(frame, "Region", col_field, VALUE_FIELDS, agg_method, workers=2, min_rows=0)
+    assert_same_pivot(result, expected)
@@ -0,0 +1,69 @@
+"""Per-column statistics behind the filter widgets."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import column_stats
+from column_stats import ColumnStats, StatsIndex
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "Region": ["North", "South", "North", None, "East", "North"],
+        "Sales": [10.0, np.nan, 30.0, 40.0, 5.0, 60.0],
+        "Date": pd.to_datetime(["2023-01-01 08:00", "2023-01-01 18:00", "2023-01-03 00:00", None,
+                                "2023-01-03 00:00", "2023-01-04 00:00"]),
+    })
+
+
+@pytest.mark.parametrize("column", ["Region", "Sales", "Date"])
+def test_merged_chunks_match_the_whole_column(frame, column):
+    whole = ColumnStats.from_series(frame[column])
+    chunked = ColumnStats.from_chunks([frame.iloc[:2], frame.iloc[2:5], frame.iloc[5:]], column)
+    assert (chunked.count, chunked.null_count) == (whole.count, whole.null_count) == (5, 1)
+    assert (chunked.minimum, chunked.maximum) == (whole.minimum, whole.maximum)
+    assert chunked.values == whole.values
+    assert chunked.distinct_count == whole.distinct_count
+    for merged, expected in [(chunked.value_counts, whole.value_counts),
+                             (chunked.daily_counts, whole.daily_counts)]:
+        if expected is not None:
+            assert merged.to_dict() == expected.to_dict()
+
+
+def test_categorical_stats(frame):
+    stats = ColumnStats.from_series(frame["Region"])
+    assert stats.kind == "categorical"
+    assert stats.values == ["East", "North", "South"]
+    assert stats.value_counts.tolist() == [1, 3, 1]
+    assert stats.distinct_count == 3 and not stats.approximate
+
+
+def test_datetime_stats_count_rows_per_day(frame):
+    stats = ColumnStats.from_series(frame["Date"])
+    assert stats.kind == "datetime"
+    assert stats.daily_counts.tolist() == [2, 2, 1]
+    assert stats.timeline() is stats.timeline()
+
+
+def test_distinct_count_is_estimated_above_the_limit(monkeypatch):
+    monkeypatch.setattr(column_stats, "DISTINCT_LIMIT", 100)
+    values = pd.Series([f"id{i}" for i in range(20_000)])
+    stats = ColumnStats.from_chunks([values[:10_000].to_frame("Id"), values[10_000:].to_frame("Id")], "Id")
+    assert stats.approximate and len(stats.values) == 100
+    assert 0.8 * 20_000 < stats.distinct_count < 1.2 * 20_000
+
+
+def test_stats_index_computes_each_column_once(frame):
+    index = StatsIndex()
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return ColumnStats.from_series(frame["Sales"])
+
+    first = index.get("v1", "Sales", compute)
+    assert index.get("v1", "Sales", compute) is first and len(computed) == 1
+    index.get("v2", "Sales", compute)
+    assert len(computed) == 2
@@ -0,0 +1,33 @@
+"""Dtype compaction at load."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregation import pivot_frame
+from compaction import compact_dtypes
+
+
+def test_compaction_is_lossless():
+    df = pd.DataFrame({"Region": ["North", "South"] * 50, "Quantity": np.arange(100, dtype="int64"),
+                       "Sales": np.arange(100) / 4, "Price": np.arange(100) / 10})
+    compacted = compact_dtypes(df)
+    assert str(compacted["Region"].dtype) == "category"
+    assert compacted["Quantity"].dtype == np.int8
+    assert compacted["Sales"].dtype == np.float32
+    # Tenths aren't exact in float32, so that column stays float64
+    assert compacted["Price"].dtype == np.float64
+    pd.testing.assert_frame_equal(compacted.astype(df.dtypes.to_dict()), df)
+
+
+@pytest.mark.parametrize("agg_method", ["sum", "mean"])
+def test_compacted_floats_aggregate_like_the_original(agg_method):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"Region": rng.choice(["North", "South"], 200_000),
+                       "Sales": rng.integers(0, 1000, 200_000) / 4 + 0.25})
+    compacted = compact_dtypes(df)
+    assert compacted["Sales"].dtype == np.float32
+    # Quarters add up exactly in float64, but not in float32
+    pd.testing.assert_frame_equal(pivot_frame(compacted, "Region", None, ["Sales"], agg_method).reset_index(drop=True),
+                                  pivot_frame(df, "Region", None, ["Sales"], agg_method).reset_index(drop=True),
+                                  check_exact=True, check_dtype=False, check_categorical=False)
@@ -0,0 +1,51 @@
+"""CSV dialect sniffing, schema inference and the parsing backends."""
+
+import pandas as pd
+import pytest
+
+from csv_parsing import infer_schema, iter_csv, pa, parse_date_formats, read_csv, sniff_dialect
+
+# pyarrow is optional
+ENGINES = ["c"] + (["pyarrow"] if pa is not None else [])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_each_date_column_is_parsed_with_its_own_format(tmp_path, engine):
+    path = tmp_path / "orders.csv"
+    path.write_text("OrderDate,ShipDate,Sales\n"
+                    "25/03/2023,03/04/2023,1.5\n"
+                    "01/02/2023,12/31/2023,2.5\n")
+    formats = {"OrderDate": "%d/%m/%Y", "ShipDate": "%m/%d/%Y"}
+    df = read_csv(str(path), infer_schema(str(path), formats), engine=engine)
+    assert df["OrderDate"].tolist() == [pd.Timestamp("2023-03-25"), pd.Timestamp("2023-02-01")]
+    assert df["ShipDate"].tolist() == [pd.Timestamp("2023-03-04"), pd.Timestamp("2023-12-31")]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shared_date_format_is_parsed_natively(tmp_path, engine):
+    path = tmp_path / "orders.csv"
+    path.write_text("OrderDate,ShipDate\n01/02/2023,03/04/2023\n")
+    df = read_csv(str(path), infer_schema(str(path), {"OrderDate": "%d/%m/%Y", "ShipDate": "%d/%m/%Y"}),
+                  engine=engine)
+    assert df.iloc[0].tolist() == [pd.Timestamp("2023-02-01"), pd.Timestamp("2023-04-03")]
+
+
+def test_sniff_dialect_detects_delimiter_and_encoding():
+    text = "Region;Sales\nMünchen;1\nKöln;2\n"
+    assert sniff_dialect(text.encode("cp1252")) == (";", "cp1252")
+    assert sniff_dialect(text.encode("utf-8")) == (";", "utf-8")
+
+
+def test_text_columns_keep_their_type_past_the_schema_prefix(tmp_path):
+    path = tmp_path / "codes.csv"
+    path.write_text("Code,Sales\n" + "A1,1\n" * 5 + "007,2\n")
+    schema = infer_schema(str(path), sample_rows=3)
+    assert "Code" in schema.text_columns
+    chunks = list(iter_csv(str(path), schema, chunk_rows=4))
+    assert pd.concat(chunks)["Code"].tolist()[-1] == "007"
+
+
+def test_parse_date_formats():
+    assert parse_date_formats("Date=%d/%m/%Y; Shipped=%Y%m%d") == {"Date": "%d/%m/%Y", "Shipped": "%Y%m%d"}
+    with pytest.raises(ValueError):
+        parse_date_formats("Date")
@@ -0,0 +1,72 @@
+"""Rollup cubes must answer the pivots they cover like ``pivot_frame``."""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregation import AGG_METHODS, pivot_frame
+from cubes import Cube, find_cube, parse_cube_specs
+from filters import DateRangeFilter, ValuesFilter, apply_filters
+from pivot_engine import PivotSpec
+
+VALUE_FIELDS = ["Sales", "Quantity"]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 500
+    df = pd.DataFrame({
+        "Region": rng.choice(["North", "South", "East", "West"], rows),
+        "Product": rng.choice(["A", "B", "C"], rows),
+        "Date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+        "Sales": rng.integers(0, 10_000, rows) / 4,
+        "Quantity": rng.integers(1, 50, rows),
+    })
+    df.loc[::17, "Sales"] = np.nan
+    return df
+
+
+def assert_same_pivot(actual, expected):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False, check_index_type=False,
+                                  check_column_type=False)
+
+
+@pytest.mark.parametrize("col_field", [None, "Product"])
+@pytest.mark.parametrize("agg_method", AGG_METHODS)
+def test_cube_answer_matches_pivot_frame(frame, agg_method, col_field):
+    cube = Cube.build(frame, (("Region", None), ("Product", None)), VALUE_FIELDS)
+    expected = pivot_frame(frame, "Region", col_field, VALUE_FIELDS, agg_method)
+    result, rows_matched = cube.answer(PivotSpec("Region", col_field, VALUE_FIELDS, agg_method))
+    assert rows_matched == len(frame)
+    assert_same_pivot(result, expected)
+
+
+@pytest.mark.parametrize("bounds", [
+    (date(2023, 3, 1), date(2023, 5, 31)),
+    (date(2023, 4, 1), None),
+    (None, date(2023, 1, 31)),
+])
+@pytest.mark.parametrize("agg_method", ["sum", "mean", "max"])
+def test_bucketed_cube_answers_month_aligned_date_filters(frame, bounds, agg_method):
+    cube = Cube.build(frame, parse_cube_specs("Region,Date:month")[0], VALUE_FIELDS)
+    assert len(cube) <= 4 * 12
+    filters = [DateRangeFilter("Date", *bounds), ValuesFilter("Region", ["North", "South"])]
+    spec = PivotSpec("Region", None, VALUE_FIELDS, agg_method, filters)
+    assert find_cube([cube], spec) is cube
+    filtered = apply_filters(frame, filters)
+    result, rows_matched = cube.answer(spec)
+    assert rows_matched == len(filtered)
+    assert_same_pivot(result, pivot_frame(filtered, "Region", None, VALUE_FIELDS, agg_method))
+
+
+def test_bucketed_cube_does_not_cover_other_pivots(frame):
+    cube = Cube.build(frame, parse_cube_specs("Region,Date:month")[0], VALUE_FIELDS)
+    # Splits a month, pivots on the bucketed column, or filters another column
+    for spec in [PivotSpec("Region", filters=[DateRangeFilter("Date", date(2023, 3, 15), None)]),
+                 PivotSpec("Date", value_fields=["Sales"]),
+                 PivotSpec("Region", value_fields=["Sales"], filters=[ValuesFilter("Product", ["A"])])]:
+        assert find_cube([cube], spec) is None
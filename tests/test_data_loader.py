@@ -0,0 +1,51 @@
+"""The dataset cache's disk tier."""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DatasetCache
+
+
+def test_disk_cache_evicts_least_recently_used_files(tmp_path):
+    frame = pd.DataFrame({"Sales": np.arange(10_000, dtype="int64")})
+    cache = DatasetCache(disk_dir=str(tmp_path), disk_format="pickle")
+    cache.put("a", frame)
+    entry_size = os.path.getsize(tmp_path / "a.pkl")
+    cache.disk_max_bytes = 3 * entry_size
+    for key, age in [("a", 30), ("b", 20), ("c", 10)]:
+        cache.put(key, frame)
+        os.utime(tmp_path / f"{key}.pkl", (0, 1_000_000_000 - age))
+    # Reading "a" back from disk makes it the most recently used file
+    cache.memory.clear()
+    assert cache.get("a") is not None
+    cache.put("d", frame)
+    assert sorted(os.listdir(tmp_path)) == ["a.pkl", "c.pkl", "d.pkl"]
+
+
+def test_disk_cache_drops_entries_larger_than_the_budget(tmp_path):
+    cache = DatasetCache(disk_dir=str(tmp_path), disk_format="pickle", disk_max_bytes=10)
+    frame = pd.DataFrame({"Sales": np.arange(1000)})
+    cache.put("a", frame)
+    assert os.listdir(tmp_path) == []
+    # It is still served from memory
+    assert cache.get("a") is frame
+
+
+def test_disk_cache_scans_the_directory_only_when_over_budget(tmp_path, monkeypatch):
+    frame = pd.DataFrame({"Sales": np.arange(10_000, dtype="int64")})
+    cache = DatasetCache(disk_dir=str(tmp_path), disk_format="pickle")
+    scans = []
+    disk_files = cache._disk_files
+    monkeypatch.setattr(cache, "_disk_files", lambda: scans.append(1) or disk_files())
+    for key in "abcd":
+        cache.put(key, frame)
+    assert len(scans) == 1
+    # Overwriting an entry doesn't count its bytes twice
+    cache.put("a", frame)
+    cache.disk_max_bytes = 4 * os.path.getsize(tmp_path / "a.pkl")
+    cache.put("b", frame)
+    assert len(scans) == 1 and len(os.listdir(tmp_path)) == 4
+    cache.put("e", frame)
+    assert len(scans) == 2 and len(os.listdir(tmp_path)) == 4
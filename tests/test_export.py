@@ -0,0 +1,40 @@
+"""Chunked export of pivot results."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from export import available_formats, export_index, export_to_tempfile, frame_chunks, read_export
+
+
+@pytest.fixture
+def result():
+    table = pd.DataFrame(np.arange(12, dtype="float64").reshape(6, 2),
+                         index=pd.Index(list("abcdef"), name="Region"),
+                         columns=pd.MultiIndex.from_tuples([("Sales", "A"), ("Sales", "B")]))
+    return export_index(table)
+
+
+@pytest.mark.parametrize("fmt", available_formats())
+def test_chunked_export_round_trips(tmp_path, result, fmt):
+    path, rows = export_to_tempfile(frame_chunks(result, chunk_rows=4), fmt, directory=str(tmp_path))
+    assert rows == 6 and path.endswith(fmt)
+    if fmt == "parquet":
+        exported = pd.read_parquet(path)
+        assert exported.columns.tolist() == ["Region", "Sales_A", "Sales_B"]
+    else:
+        exported = pd.read_csv(path, header=[0, 1])
+    assert exported.iloc[:, 0].tolist() == list("abcdef")
+    assert exported.iloc[:, 2].tolist() == result.iloc[:, 2].tolist()
+
+
+def test_old_exports_are_purged(tmp_path, result):
+    old, _ = export_to_tempfile(frame_chunks(result), directory=str(tmp_path))
+    os.utime(old, (0, 0))
+    new, _ = export_to_tempfile(frame_chunks(result), directory=str(tmp_path))
+    assert os.listdir(tmp_path) == [os.path.basename(new)]
+    # A download of a purged export gets an empty file instead of an error
+    assert read_export(old) == b""
+    assert read_export(new).startswith(b"Region")
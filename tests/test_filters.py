@@ -0,0 +1,70 @@
+"""Filters, how they combine into one mask, and the mask cache."""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import DateRangeFilter, MaskCache, RangeFilter, ValuesFilter, apply_filters, combined_mask
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "Region": ["North", "South", "North", "East", None],
+        "Sales": [10.0, 20.0, np.nan, 40.0, 50.0],
+        "Date": pd.to_datetime(["2023-01-01 00:00", "2023-01-02 18:00", "2023-01-03 00:00", None, "2023-01-05 00:00"]),
+    })
+
+
+def test_range_filter_is_inclusive_and_drops_missing(frame):
+    assert RangeFilter("Sales", 20, 40).mask(frame).tolist() == [False, True, False, True, False]
+
+
+def test_values_filter_ignores_selection_order(frame):
+    flt = ValuesFilter("Region", ["South", "North"])
+    assert flt == ValuesFilter("Region", ("North", "South"))
+    assert hash(flt) == hash(ValuesFilter("Region", ("North", "South")))
+    assert flt.mask(frame).tolist() == [True, True, True, False, False]
+
+
+def test_date_range_filter_includes_the_whole_end_day(frame):
+    flt = DateRangeFilter("Date", date(2023, 1, 2), date(2023, 1, 3))
+    assert flt.mask(frame).tolist() == [False, True, True, False, False]
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (date(2023, 1, 3), None, [False, False, True, False, True]),
+    (None, date(2023, 1, 2), [True, True, False, False, False]),
+    (None, None, [True, True, True, False, True]),
+])
+def test_date_range_filter_open_bounds(frame, start, end, expected):
+    assert DateRangeFilter("Date", start, end).mask(frame).tolist() == expected
+
+
+def test_date_range_filter_on_timezone_aware_column(frame):
+    aware = frame.assign(Date=frame["Date"].dt.tz_localize("Europe/Berlin"))
+    flt = DateRangeFilter("Date", date(2023, 1, 2), date(2023, 1, 2))
+    assert flt.mask(aware).tolist() == [False, True, False, False, False]
+
+
+def test_apply_filters_slices_once_and_returns_unfiltered_frame(frame):
+    assert apply_filters(frame, []) is frame
+    filters = [RangeFilter("Sales", 0, 100), ValuesFilter("Region", ["North", "South"])]
+    assert apply_filters(frame, filters).index.tolist() == [0, 1]
+    assert combined_mask(frame, []) is None
+
+
+def test_mask_cache_reuses_masks_per_dataset(frame):
+    cache = MaskCache()
+    flt = ValuesFilter("Region", ["North"])
+    first = cache.mask(frame, "a", flt)
+    assert cache.mask(frame, "a", ValuesFilter("Region", ["North"])) is first
+    assert not first.flags.writeable
+    # Another dataset with the same filter gets its own mask
+    other = frame.iloc[::-1].reset_index(drop=True)
+    assert cache.mask(other, "b", flt).tolist() == flt.mask(other).tolist()
+    # Combining cached masks doesn't modify them
+    combined_mask(frame, [flt, RangeFilter("Sales", 15, 100)], cache=cache, dataset_id="a")
+    assert first.tolist() == [True, False, True, False, False]
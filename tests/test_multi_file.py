@@ -0,0 +1,55 @@
+"""Directory datasets, pruned by their date filter."""
+
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from data_loader import DatasetCache
+from filters import DateRangeFilter, MaskCache, ValuesFilter, apply_filters
+from pivot_engine import PivotSpec, execute, filter_dataset, open_dataset
+
+
+@pytest.fixture
+def daily_files(tmp_path):
+    sales = 0
+    for day, rows in [("2023-01-01", 3), ("2023-01-02", 4), ("2023-01-03", 3)]:
+        pd.DataFrame({
+            "Region": ["North", "South", "North", "South"][:rows],
+            "Date": [day] * rows,
+            "Sales": range(sales, sales + rows),
+        }).to_csv(tmp_path / f"{day}.csv", index=False)
+        sales += rows
+    return tmp_path
+
+
+def test_masks_of_pruned_multi_file_loads_stay_separate(daily_files):
+    # A pruned load holds other rows than the full dataset, so a mask cached
+    # for one must not be applied to the other
+    dataset = open_dataset(str(daily_files), cache=DatasetCache())
+    cache = MaskCache()
+    north = ValuesFilter("Region", ["North"])
+    ranges = [None, (date(2023, 1, 1), date(2023, 1, 1)), (date(2023, 1, 2), date(2023, 1, 3)),
+              (date(2023, 1, 3), None), None]
+    everything = pd.concat(pd.read_csv(path, parse_dates=["Date"]) for path in sorted(daily_files.glob("*.csv")))
+    for bounds in ranges:
+        filters = [north] + ([DateRangeFilter("Date", *bounds)] if bounds else [])
+        spec = PivotSpec("Region", None, ["Sales"], "sum", filters)
+        _, filtered = filter_dataset(dataset, spec, mask_cache=cache)
+        expected = apply_filters(everything, filters)
+        assert sorted(filtered["Sales"].tolist()) == sorted(expected["Sales"].tolist())
+        result = execute(dataset, spec, mask_cache=cache)
+        assert result.table["Sales"].tolist() == [expected["Sales"].sum()]
+        assert result.rows_matched == len(expected)
+    assert dataset.num_rows() == 10
+
+
+def test_date_filter_prunes_files_without_matching_rows(daily_files):
+    dataset = open_dataset(str(daily_files / "*.csv"), cache=DatasetCache())
+    assert dataset.prune() == [0, 1, 2]
+    assert dataset.prune([DateRangeFilter("Date", date(2023, 1, 2), None)]) == [1, 2]
+    assert dataset.prune([DateRangeFilter("Date", None, date(2023, 1, 1))]) == [0]
+    assert dataset.prune([DateRangeFilter("Date", date(2024, 1, 1), None)]) == []
+    loaded = dataset.load(["Sales"], filters=[DateRangeFilter("Date", date(2023, 1, 3), None)])
+    assert loaded["Sales"].tolist() == [7, 8, 9]
+    assert dataset.load_id() == dataset.dataset_id != dataset.load_id([DateRangeFilter("Date", date(2023, 1, 3))])
@@ -0,0 +1,24 @@
+"""Sorting and windowing of large pivot results."""
+
+import numpy as np
+import pandas as pd
+
+from paging import page_count, sorted_positions, window_frame
+
+
+def test_sorted_positions_put_missing_values_last():
+    df = pd.DataFrame({"Sales": [3.0, np.nan, 1.0, 2.0]}, index=["a", "b", "c", "d"])
+    assert sorted_positions(df).tolist() == [0, 1, 2, 3]
+    assert sorted_positions(df, 0).tolist() == [2, 3, 0, 1]
+    assert sorted_positions(df, 0, descending=True).tolist() == [0, 3, 2, 1]
+    assert sorted_positions(df, 0, descending=True, top_n=2).tolist() == [0, 3]
+
+
+def test_window_frame_returns_one_page_and_column_window():
+    df = pd.DataFrame(np.arange(50).reshape(10, 5), columns=list("abcde"))
+    positions = sorted_positions(df, 0, descending=True)
+    assert page_count(len(positions), 4) == 3
+    window = window_frame(df, positions, 3, 4, col_start=1, col_count=2)
+    assert window.index.tolist() == [1, 0]
+    assert window.columns.tolist() == ["b", "c"]
+    assert page_count(0, 4) == 1
@@ -0,0 +1,73 @@
+"""The headless pivot engine and its command line."""
+
+import math
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from filters import DateRangeFilter, RangeFilter, ValuesFilter
+from pivot_engine import PivotResult, PivotSpec, ResultCache, main, output_stems, parse_filter
+
+
+def test_output_stems_keep_inputs_with_the_same_name_apart(tmp_path):
+    paths = [str(tmp_path / "a" / "data.csv"), str(tmp_path / "b" / "data.csv"),
+             str(tmp_path / "b" / "extra.csv"), str(tmp_path / "b" / "extra.parquet")]
+    assert output_stems(paths) == [os.path.join("a", "data"), os.path.join("b", "data"),
+                                   os.path.join("b", "extra.csv"), os.path.join("b", "extra.parquet")]
+    assert output_stems([str(tmp_path / "data.csv")]) == ["data"]
+
+
+def test_cli_writes_one_output_per_input(tmp_path):
+    for folder, sales in [("a", 1.0), ("b", 2.0)]:
+        os.makedirs(tmp_path / folder)
+        pd.DataFrame({"Region": ["North"], "Sales": [sales]}).to_csv(tmp_path / folder / "data.csv", index=False)
+    assert main([str(tmp_path / "*" / "data.csv"), "--rows", "Region", "--values", "Sales",
+                 "--output-dir", str(tmp_path / "out")]) == 0
+    for folder, sales in [("a", 1.0), ("b", 2.0)]:
+        assert pd.read_csv(tmp_path / "out" / folder / "data.pivot.csv")["Sales"].tolist() == [sales]
+
+
+@pytest.fixture
+def sample():
+    return pd.DataFrame({"Region": ["North", "South"], "Sales": [10.0, 20.0],
+                         "Date": pd.to_datetime(["2023-01-01", "2023-01-05"])})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Region=North,South", ValuesFilter("Region", ["North", "South"])),
+    ("Sales=10,20", ValuesFilter("Sales", [10.0, 20.0])),
+    ("Sales:5..15", RangeFilter("Sales", 5.0, 15.0)),
+    ("Sales:5..", RangeFilter("Sales", 5.0, math.inf)),
+    ("Date:2023-01-03..", DateRangeFilter("Date", date(2023, 1, 3), None)),
+    ("Date:..2023-01-03", DateRangeFilter("Date", None, date(2023, 1, 3))),
+])
+def test_parse_filter(sample, text, expected):
+    assert parse_filter(text, sample) == expected
+
+
+@pytest.mark.parametrize("text", ["Region", "Missing=1", "Region:a..b"])
+def test_parse_filter_rejects_invalid_filters(sample, text):
+    with pytest.raises(ValueError):
+        parse_filter(text, sample)
+
+
+def test_result_cache_hits_on_the_same_spec_and_misses_on_a_new_dataset():
+    cache = ResultCache()
+    spec = PivotSpec("Region", value_fields=["Sales"], filters=[ValuesFilter("Region", ["North"])])
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return PivotResult(pd.DataFrame({"Sales": [1.0]}), 10, 4)
+
+    result, cached = cache.get_or_compute("v1", spec, compute)
+    assert not cached and (result.rows_read, result.rows_matched) == (10, 4)
+    # An equal spec built separately hits; a changed filter or a new dataset id misses
+    result, cached = cache.get_or_compute("v1", PivotSpec("Region", value_fields=("Sales",),
+                                                          filters=(ValuesFilter("Region", ["North"]),)), compute)
+    assert cached and result.table["Sales"].tolist() == [1.0] and len(computed) == 1
+    assert cache.get("v1", PivotSpec("Region", value_fields=["Sales"])) is None
+    assert cache.get("v2", spec) is None
+    assert cache.get("v1", spec, streaming=True) is None
@@ -0,0 +1,62 @@
+"""Sampled previews must bracket the exact pivot."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregation import pivot_frame
+from filters import RangeFilter
+from pivot_engine import PivotSpec
+from sampling import approximate_pivot, block_sample, estimate_rows, uniform_sample
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 200_000
+    return pd.DataFrame({
+        "Region": rng.choice(["North", "South", "East", "West"], rows),
+        "Sales": rng.gamma(2.0, 100.0, rows).round(2),
+        "Quantity": rng.integers(1, 50, rows),
+    })
+
+
+@pytest.fixture(scope="module")
+def csv_path(frame, tmp_path_factory):
+    path = tmp_path_factory.mktemp("sampling") / "data.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("agg_method", ["sum", "mean", "count"])
+def test_estimates_are_within_their_margin(frame, agg_method):
+    spec = PivotSpec("Region", None, ["Sales"], agg_method, [RangeFilter("Quantity", 10, 40)])
+    approx = approximate_pivot(uniform_sample(frame, 20_000), spec, len(frame))
+    exact = pivot_frame(frame[frame["Quantity"].between(10, 40)], "Region", None, ["Sales"], agg_method)
+    exact = exact.set_index("Region")["Sales"]
+    estimate = approx.table.set_index("Region")["Sales"]
+    margin = approx.margin.set_index("Region")["Sales"]
+    # Twice the 95% margin is about four standard errors
+    assert ((estimate - exact).abs() <= 2 * margin).all()
+    assert (margin < 0.1 * estimate).all()
+    assert approx.sample_rows == 20_000 and approx.population_rows == len(frame)
+    assert abs(approx.rows_matched - frame["Quantity"].between(10, 40).sum()) < 0.02 * len(frame)
+
+
+def test_sample_of_everything_is_exact(frame):
+    spec = PivotSpec("Region", None, ["Sales"], "sum")
+    approx = approximate_pivot(frame, spec, len(frame))
+    exact = pivot_frame(frame, "Region", None, ["Sales"], "sum")
+    assert np.allclose(approx.table["Sales"], exact["Sales"])
+    assert (approx.margin["Sales"] == 0).all()
+
+
+def test_block_sample_estimates_the_row_count(frame, csv_path):
+    assert abs(estimate_rows(str(csv_path)) - len(frame)) < 0.05 * len(frame)
+    sample, population = block_sample(str(csv_path), 5_000, usecols=["Region", "Sales"])
+    assert sample.columns.tolist() == ["Region", "Sales"]
+    assert 4_000 <= len(sample) <= 6_000
+    assert abs(population - len(frame)) < 0.05 * len(frame)
+    # Small files are read whole
+    small, rows = block_sample(str(csv_path), 10 ** 6)
+    assert len(small) == rows == len(frame)
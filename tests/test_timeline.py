@@ -0,0 +1,21 @@
+"""Timeline histograms stay within their bar budget."""
+
+import pandas as pd
+import pytest
+
+from timeline import DEFAULT_MAX_BINS, timeline_histogram
+
+
+@pytest.mark.parametrize("start, end, label", [
+    ("2023-01-01", "2023-03-01", "day"),
+    ("2013-01-15", "2023-01-10", "quarter"),
+    ("2000-01-01", "2119-12-31", "year"),
+    ("1900-06-01", "2023-01-01", "2 years"),
+    ("1700-03-05", "2200-07-01", "5 years"),
+])
+def test_timeline_histogram_stays_within_max_bins(start, end, label):
+    times = pd.date_range(start, end, periods=1000)
+    histogram, bin_label = timeline_histogram(times)
+    assert bin_label == label
+    assert len(histogram) <= DEFAULT_MAX_BINS
+    assert histogram["count"].sum() == len(times)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Timeline histograms for the CSV Pivot Table Viewer's date filters.
+
+A chart with one bar per distinct day gets unreadable and heavy on
+multi-year data. ``timeline_histogram`` picks the finest bin width (day,
+week, month, quarter, year or several years) that keeps the chart within
+``max_bins`` bars and counts rows per bin with ``np.histogram`` over int64
+timestamps, so the payload sent to the browser stays bounded however long
+the date span is.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BINS = 120
+
+# Candidate bin widths, finest first: (label, pandas frequency, approximate days)
+BIN_WIDTHS = [
+    ("day", "D", 1),
+    ("week", "W-MON", 7),
+    ("month", "MS", 30.4),
+    ("quarter", "QS", 91.3),
+    ("year", "YS", 365.25),
+]
+
+
+def choose_bin_width(start, end, max_bins=DEFAULT_MAX_BINS):
+    """Return the finest ``(label, freq)`` giving at most ``max_bins`` bins.
+
+    Spans too long for yearly bins get bins of several years.
+    """
+    span_days = (end - start) / pd.Timedelta(days=1) + 1
+    for label, freq, days in BIN_WIDTHS:
+        # Edges snap to the calendar, which can add a partial bin at either end
+        if span_days / days <= max_bins and len(bin_edges(start, end, freq)) - 1 <= max_bins:
+            return label, freq
+    years = -(-(end.year - start.year + 1) // max_bins)
+    return f"{years} years", f"{years}YS"
+
+
+def bin_edges(start, end, freq):
+    """Return bin edges covering ``[start, end]``, aligned to ``freq``."""
+    first = pd.Timestamp(start).normalize()
+    # Snap the first edge back onto the frequency (e.g. a Monday or the 1st)
+    offset = pd.tseries.frequencies.to_offset(freq)
+    if not offset.is_on_offset(first):
+        first = offset.rollback(first)
+    edges = pd.date_range(first, end, freq=freq)
+    # One more edge closes the last bin past ``end``
+    return edges.append(pd.DatetimeIndex([edges[-1] + offset]))
+
+
+def timeline_histogram(times, weights=None, max_bins=DEFAULT_MAX_BINS):
+    """Count ``times`` (optionally weighted) into at most ``max_bins`` bins.
+
+    Returns ``(DataFrame with 'date' and 'count' columns, bin label)``; each
+    bin is labelled with its start.
+    """
+    times = pd.DatetimeIndex(times)
+    if len(times) == 0:
+        return pd.DataFrame({"date": pd.DatetimeIndex([]), "count": np.array([], dtype="int64")}), "day"
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    start, end = times.min(), times.max()
+    label, freq = choose_bin_width(start, end, max_bins)
+    edges = bin_edges(start, end, freq).as_unit(times.unit)
+    counts, _ = np.histogram(times.asi8, bins=edges.asi8, weights=weights)
+    return pd.DataFrame({"date": edges[:-1], "count": counts.astype("int64")}), label